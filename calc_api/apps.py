@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CalcApiConfig(AppConfig):
     name = 'calc_api'
+
+    def ready(self):
+        from calc_api.vizz import signals  # noqa: F401 (connects the signal receivers)
+        from calc_api.job_management import sync_executor  # noqa: F401 (marks requests for the sync executor)
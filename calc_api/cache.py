@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import uuid
+
+from django.core.cache import caches
+
+from calc_api.config import ClimadaCalcApiConfig
+
+conf = ClimadaCalcApiConfig()
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+_MISSING = object()
+
+STATS = ['hits', 'misses']
+
+
+def shared_incr(backend, key):
+    """Add one to a counter in a cache backend, creating it if needed. add and incr are atomic in the shared backends,
+    so concurrent increments from every worker all count"""
+    backend.add(key, 0, timeout=None)
+    try:
+        return backend.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        backend.add(key, 1, timeout=None)
+        return 1
+
+
+class SharedVersion:
+    """
+    A version tag in the shared cache for data that every worker keeps its own copy of. Writers bump it, and a worker
+    whose copy was built from an older tag rebuilds it. Tags are random rather than counted, so one that's evicted and
+    recreated can't match a tag from before.
+    """
+
+    def __init__(self, key, alias='default'):
+        self.key = key
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self):
+        version = self.backend.get(self.key)
+        if version is None:
+            self.backend.add(self.key, uuid.uuid4().hex, timeout=None)
+            version = self.backend.get(self.key)
+        return version
+
+    def bump(self):
+        self.backend.set(self.key, uuid.uuid4().hex, timeout=None)
+
+
+class EndpointCache:
+    """
+    One endpoint's view of the shared Django cache (locmem, file or Redis, see settings.CACHES), with its own key
+    prefix and timeout from climada_calc-config.yaml. A timeout of 0 turns caching off for the endpoint. Hit and miss
+    counts are kept in the shared cache too, so they add up over all workers.
+    """
+
+    def __init__(self, endpoint, timeout, alias='default'):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        return self.timeout != 0
+
+    def make_key(self, *parts):
+        digest = hashlib.md5('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+        return f'{self.endpoint}:{digest}'
+
+    def _stats_key(self, stat):
+        return f'{self.endpoint}:stats:{stat}'
+
+    def _count(self, stat):
+        shared_incr(self.backend, self._stats_key(stat))
+
+    @property
+    def stats(self):
+        counts = self.backend.get_many([self._stats_key(stat) for stat in STATS])
+        return {stat: counts.get(self._stats_key(stat), 0) for stat in STATS}
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        value = self.backend.get(key, _MISSING)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def set(self, key, value, timeout=None):
+        """Store a value for the endpoint's timeout, or for timeout seconds if that's given and shorter"""
+        if self.enabled:
+            self.backend.set(key, value, timeout=min(timeout, self.timeout) if timeout else self.timeout)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def get_or_set(self, key, func):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.set(key, value)
+        return value
+
+
+ENDPOINT_CACHES = {
+    endpoint: EndpointCache(endpoint, timeout)
+    for endpoint, timeout in conf.CACHE_ENDPOINT_TIMEOUTS.items()
+}
+
+
+def get_endpoint_cache(endpoint) -> EndpointCache:
+    try:
+        return ENDPOINT_CACHES[endpoint]
+    except KeyError:
+        raise ValueError(f'No cache policy for endpoint {endpoint}. '
+                         f'Set one in climada_calc-config.yaml under cache: endpoints:') from None
+
+
+def cache_stats():
+    return {endpoint: dict(cache.stats, timeout=cache.timeout) for endpoint, cache in ENDPOINT_CACHES.items()}
@@ -0,0 +1,277 @@
+import asyncio
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Future
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.calc_methods.location_geometry import LOCATIONS_VERSION
+from calc_api.vizz.models import Location
+from calc_api.vizz.schemas_geocoding import GeocodePlace
+
+conf = ClimadaCalcApiConfig()
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+# Match classes, best first
+EXACT, NAME_PREFIX, WORD_PREFIX, FUZZY = range(4)
+
+
+def normalise(s):
+    """Lower case, accents removed, punctuation collapsed to single spaces: 'Zürich, CH' -> 'zurich ch'"""
+    s = unicodedata.normalize('NFKD', str(s))
+    s = ''.join(c for c in s if not unicodedata.combining(c))
+    return re.sub(r'[\W_]+', ' ', s.lower()).strip()
+
+
+def trigrams(s):
+    padded = f'  {s} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    """
+    In-memory autocomplete over the Location table. Place names and each word in them go in a sorted list for
+    prefix search, and a trigram index catches typos and mid-word matches. The index is built on first use and
+    rebuilt on the next query after LOCATIONS_VERSION changes, i.e. after a Location write in any worker.
+    """
+
+    def __init__(self, min_similarity=0.3):
+        self.min_similarity = min_similarity
+        self._places = []
+        self._names = []
+        self._prefix_keys = []
+        self._trigrams = {}
+        self._ids = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._version = None
+
+    def _build(self, version):
+        places, names, prefix_keys, ids = [], [], [], {}
+        grams = defaultdict(set)
+        for loc in Location.objects.all():
+            try:
+                place = GeocodePlace.from_location_model(loc)
+            except Exception as e:
+                LOGGER.warning(f'Leaving location {loc.name} out of the autocomplete index: {e}')
+                continue
+            i = len(places)
+            name = normalise(loc.name)
+            places.append(place)
+            names.append(name)
+            ids[str(loc.id)] = i
+            prefix_keys.append((name, i))
+            words = name.split(' ')
+            for j in range(1, len(words)):
+                prefix_keys.append((' '.join(words[j:]), i))
+            for gram in trigrams(name):
+                grams[gram].add(i)
+
+        prefix_keys.sort()
+        self._places, self._names, self._prefix_keys, self._trigrams = places, names, prefix_keys, dict(grams)
+        self._ids = ids
+        self._version = version
+        LOGGER.debug(f'Built autocomplete index over {len(places)} locations')
+
+    def _ensure_built(self):
+        version = LOCATIONS_VERSION.get()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._build(version)
+
+    def _prefix_matches(self, query):
+        start = bisect.bisect_left(self._prefix_keys, (query, -1))
+        for key, i in self._prefix_keys[start:]:
+            if not key.startswith(query):
+                break
+            yield key, i
+
+    def _fuzzy_matches(self, query):
+        query_grams = trigrams(query)
+        counts = defaultdict(int)
+        for gram in query_grams:
+            for i in self._trigrams.get(gram, ()):
+                counts[i] += 1
+        for i, n_shared in counts.items():
+            # Similarity in the style of pg_trgm: shared trigrams over all trigrams in either string
+            similarity = n_shared / (len(query_grams) + len(trigrams(self._names[i])) - n_shared)
+            if similarity >= self.min_similarity:
+                yield i, similarity
+
+    def search(self, s, limit=10):
+        """Ranked GeocodePlaces matching a partial place name"""
+        query = normalise(s)
+        if not query:
+            return []
+        self._ensure_built()
+
+        best = {}
+        # A location's id, like its full name, is an exact match
+        if s.strip() in self._ids:
+            best[self._ids[s.strip()]] = (EXACT, 0)
+        for key, i in self._prefix_matches(query):
+            if key == self._names[i]:
+                match = EXACT if key == query else NAME_PREFIX
+            else:
+                match = WORD_PREFIX
+            best[i] = min(best.get(i, (match, 0)), (match, 0))
+        if len(best) < limit:
+            for i, similarity in self._fuzzy_matches(query):
+                if i not in best:
+                    best[i] = (FUZZY, -similarity)
+
+        ranked = sorted(best, key=lambda i: (*best[i], len(self._names[i]), self._names[i]))
+        return [self._places[i] for i in ranked[:limit]]
+
+    def __len__(self):
+        self._ensure_built()
+        return len(self._places)
+
+
+AUTOCOMPLETE_INDEX = AutocompleteIndex(min_similarity=conf.AUTOCOMPLETE_MIN_SIMILARITY)
+
+
+def matches_prefix(place, query):
+    """Whether a suggestion for a shorter query is still a suggestion for this normalised query"""
+    name = normalise(place.name)
+    return name.startswith(query) or f' {query}' in f' {name}'
+
+
+class CoalescingSuggestions:
+    """
+    Short-lived, in-process cache for geocoder suggestions that collapses the one-request-per-keystroke pattern
+    from the front end. Concurrent identical queries share one provider call. A query whose prefix has recent (or
+    in-flight) results is answered by filtering those results, when any of them still match.
+    """
+
+    def __init__(self, ttl=30, min_prefix_length=3, max_entries=1000):
+        self.ttl = ttl
+        self.min_prefix_length = min_prefix_length
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, query):
+        entry = self._results.get(query)
+        if entry is None:
+            return None
+        expires, places = entry
+        if expires < time.monotonic():
+            del self._results[query]
+            return None
+        return places
+
+    def _prefixes(self, query):
+        # Longest first: the most specific earlier query has the best results to filter
+        return [query[:n] for n in range(len(query) - 1, self.min_prefix_length - 1, -1)]
+
+    def _claim(self, query):
+        """
+        Returns (places, None, False, False) when the answer is already known. Otherwise returns
+        (None, future, waiting_on_prefix, leader) for a provider call in flight, which the caller must make when it's
+        the leader.
+        """
+        with self._lock:
+            places = self._cached(query)
+            if places is not None:
+                return places, None, False, False
+            for prefix in self._prefixes(query):
+                places = self._cached(prefix)
+                if places:
+                    filtered = [place for place in places if matches_prefix(place, query)]
+                    if filtered:
+                        return filtered, None, False, False
+            future = self._in_flight.get(query)
+            if future is not None:
+                return None, future, False, False
+            future = next((self._in_flight[p] for p in self._prefixes(query) if p in self._in_flight), None)
+            if future is not None:
+                return None, future, True, False
+            future = Future()
+            self._in_flight[query] = future
+            return None, future, False, True
+
+    def _finish(self, query, future, places=None, error=None):
+        with self._lock:
+            if error is None:
+                self._results[query] = (time.monotonic() + self.ttl, places)
+                self._results.move_to_end(query)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+            del self._in_flight[query]
+        if error is None:
+            future.set_result(places)
+        else:
+            future.set_exception(error)
+
+    def _abandon(self, query, future):
+        # The call was interrupted (cancelled, say): don't leave concurrent queries waiting on it
+        if not future.done():
+            self._finish(query, future, error=LookupError(f'The suggestions call for {query} was interrupted'))
+
+    @staticmethod
+    def _after_wait(query, places, waiting_on_prefix):
+        # None means the shorter query's results don't help: go round again, now that they're cached
+        if not waiting_on_prefix:
+            return places
+        return [place for place in places if matches_prefix(place, query)] or None
+
+    def get(self, s, fetch):
+        """Suggestions for s, calling fetch() (which returns a list of GeocodePlaces) only when we have to"""
+        query = normalise(s)
+        places, future, waiting_on_prefix, leader = self._claim(query)
+        if future is None:
+            return places
+        if not leader:
+            places = self._after_wait(query, future.result(), waiting_on_prefix)
+            return self.get(s, fetch) if places is None else places
+        try:
+            places = fetch()
+        except Exception as e:
+            self._finish(query, future, error=e)
+            raise
+        else:
+            self._finish(query, future, places)
+        finally:
+            self._abandon(query, future)
+        return places
+
+    async def aget(self, s, afetch):
+        """get for async views: afetch is a coroutine function, and waiting on other calls doesn't block the loop"""
+        query = normalise(s)
+        places, future, waiting_on_prefix, leader = self._claim(query)
+        if future is None:
+            return places
+        if not leader:
+            places = self._after_wait(query, await asyncio.wrap_future(future), waiting_on_prefix)
+            return await self.aget(s, afetch) if places is None else places
+        try:
+            places = await afetch()
+        except Exception as e:
+            self._finish(query, future, error=e)
+            raise
+        else:
+            self._finish(query, future, places)
+        finally:
+            self._abandon(query, future)
+        return places
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+REMOTE_SUGGESTIONS = CoalescingSuggestions(
+    ttl=conf.AUTOCOMPLETE_COALESCE_TTL,
+    min_prefix_length=conf.AUTOCOMPLETE_MIN_PREFIX_LENGTH
+)
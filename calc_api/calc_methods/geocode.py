@@ -1,15 +1,20 @@
-import requests
 import logging
 import re
 from pycountry import countries
 
 from calc_api.calc_methods.util import country_to_iso
 
-from climada_calc.settings import GEOCODE_URL, MAPTILER_KEY
 from calc_api.vizz.schemas_geocoding import GeocodePlaceList, GeocodePlace
 from calc_api.calc_methods.util import bbox_to_coords
 from calc_api.config import ClimadaCalcApiConfig
+from calc_api.util import RequestValidationError
 from calc_api.vizz.models import Location
+from calc_api.cache import get_endpoint_cache
+from calc_api.calc_methods import geocode_cache
+from calc_api.calc_methods.geocoder_client import get_client
+from calc_api.calc_methods.autocomplete import AUTOCOMPLETE_INDEX, REMOTE_SUGGESTIONS
+from calc_api.calc_methods.spatial_index import SPATIAL_INDEX
+from calc_api.job_management.sync_executor import run_sync
 
 conf = ClimadaCalcApiConfig()
 
@@ -19,8 +24,96 @@ LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
 PRECISION = 6   # Decimal places to round to for lat lon. To avoid rounding errors when calculating hashes
                 # from the same input twice. TODO come back to this, we're still at risk of rounding errors
 
+LANGUAGE = 'en'
+
+GEOCODE_CACHE = get_endpoint_cache('geocode')
+
+
+class PlaceNotFoundError(ValueError):
+    pass
+
+
+def _get_cached_place(lookup, query):
+    """A place dict or NOT_FOUND from the shared cache or the GeocodeCache table, or None if neither knows"""
+    # Places are cached as dicts so cached values don't depend on the schema class's pickled layout
+    key = GEOCODE_CACHE.make_key(conf.GEOCODER, lookup, query, LANGUAGE)
+    place = GEOCODE_CACHE.get(key)
+    if place is None:
+        place = geocode_cache.get_stored_place(conf.GEOCODER, lookup, query, LANGUAGE)
+        if place is not None:
+            GEOCODE_CACHE.set(key, place, timeout=geocode_cache.negative_ttl(place))
+    return place
+
+
+def _set_cached_place(lookup, query, place):
+    geocode_cache.store_place(conf.GEOCODER, lookup, query, LANGUAGE, None if place == geocode_cache.NOT_FOUND else place)
+    GEOCODE_CACHE.set(GEOCODE_CACHE.make_key(conf.GEOCODER, lookup, query, LANGUAGE), place,
+                      timeout=geocode_cache.negative_ttl(place))
+
+
+def _place_from_cached(query, place):
+    if place == geocode_cache.NOT_FOUND:
+        raise PlaceNotFoundError(f'Could not identify a place corresponding to {query}')
+    return GeocodePlace(**place)
+
+
+def _cached_place(lookup, query, geocode_func):
+    """
+    Geocode with a shared cache in front of the persistent GeocodeCache table in front of the geocoding provider.
+    Both tiers also remember places that the provider couldn't find.
+    """
+    place = _get_cached_place(lookup, query)
+    if place is None:
+        try:
+            result = geocode_func(query)
+        except PlaceNotFoundError:
+            _set_cached_place(lookup, query, geocode_cache.NOT_FOUND)
+            raise
+        if not isinstance(result, GeocodePlace):
+            return result
+        place = result.dict()
+        _set_cached_place(lookup, query, place)
+    return _place_from_cached(query, place)
+
+
+async def _acached_place(lookup, query, ageocode_func):
+    """_cached_place for async views: the cache tiers run on the sync executor and the provider call is awaited"""
+    place = await run_sync(_get_cached_place, lookup, query)
+    if place is None:
+        try:
+            result = await ageocode_func(query)
+        except PlaceNotFoundError:
+            await run_sync(_set_cached_place, lookup, query, geocode_cache.NOT_FOUND)
+            raise
+        if not isinstance(result, GeocodePlace):
+            return result
+        place = result.dict()
+        await run_sync(_set_cached_place, lookup, query, place)
+    return _place_from_cached(query, place)
+
 
 def standardise_location(location_name=None, location_code=None, location_scale=None, location_poly=None):
+    place = _standardise_location_locally(location_name, location_code, location_scale, location_poly)
+    if place:
+        return place
+    if location_code:
+        return location_from_code(location_code)
+    else:
+        return location_from_name(location_name)
+
+
+async def astandardise_location(location_name=None, location_code=None, location_scale=None, location_poly=None):
+    place = _standardise_location_locally(location_name, location_code, location_scale, location_poly)
+    if place:
+        return place
+    if location_code:
+        return await alocation_from_code(location_code)
+    else:
+        return await alocation_from_name(location_name)
+
+
+def _standardise_location_locally(location_name=None, location_code=None, location_scale=None, location_poly=None):
+    """Validate location parameters and handle the cases that don't need a geocoder"""
     if not location_name and not location_code:
         raise ValueError('location data requires location_name or location_code to be properties')
 
@@ -48,15 +141,14 @@ def standardise_location(location_name=None, location_code=None, location_scale=
     # if not location_code and re.search('[\d]{3}', location_name):
     #     LOGGER.warning(f'Looks like location code was provided as location name. Using it as a code: {location_name}')
     #     location_code = location_name
-
-    if location_code:
-        return location_from_code(location_code)
-    else:
-        return location_from_name(location_name)
+    return None
 
 
-# TODO cache these results
 def location_from_code(location_code):
+    return _cached_place('code', location_code, _location_from_code)
+
+
+def _location_from_code(location_code):
     if conf.GEOCODER == 'osmnames':
         try:
             return get_one_place(location_code, exact=True)
@@ -68,39 +160,49 @@ def location_from_code(location_code):
                            'Error message: {msg}')
 
     elif conf.GEOCODER == 'nominatim_web':
-        if location_code:
-            url = f'https://nominatim.openstreetmap.org/lookup?q=N{location_code}&format=json'
-        place = requests.request('GET', url)
-        return osmnames_to_schema(place.json())
+        place = get_client().lookup(location_code)
+        return osmnames_to_schema(place)
 
     # TODO see if maptiler responses are sorted by the 'relevance' property or if we need to do that
     elif conf.GEOCODER == 'maptiler':
-        language = 'en'
-        url = f'https://api.maptiler.com/geocoding/{location_code}.json?language={language}&key={MAPTILER_KEY}'
-        place = requests.get(url=url, headers={'Origin': 'reca-api.herokuapp.com'})  # TODO split this to a setting?
-        place = place.json()['features'][0]
-        return maptiler_to_schema(place)
+        features = get_client().search(location_code, language=LANGUAGE)
+        return _first_maptiler_place(features, location_code)
 
     else:
         raise ValueError(f"No valid geocoder selected. Set in climada_calc-config.yaml. Possible values: osmnames, nominatim_web. Current value: {conf.GEOCODER}")
 
 
-# TODO cache these results
+async def alocation_from_code(location_code):
+    return await _acached_place('code', location_code, _alocation_from_code)
+
+
+async def _alocation_from_code(location_code):
+    if conf.GEOCODER == 'nominatim_web':
+        place = await get_client().alookup(location_code)
+        return osmnames_to_schema(place)
+    elif conf.GEOCODER == 'maptiler':
+        features = await get_client().asearch(location_code, language=LANGUAGE)
+        return _first_maptiler_place(features, location_code)
+    else:
+        # osmnames checks the Location table before calling out
+        return await run_sync(_location_from_code, location_code)
+
+
 def location_from_name(location_name):
+    return _cached_place('name', location_name, _location_from_name)
+
+
+def _location_from_name(location_name):
     if conf.GEOCODER == 'osmnames':
         out = get_one_place(location_name, exact=False)
 
     elif conf.GEOCODER == 'nominatim_web':
-        url = f'https://nominatim.openstreetmap.org/search?q={location_name}&format=json'
-        place = requests.request('GET', url)
-        out = osmnames_to_schema(place.json())
+        place = get_client().search(location_name)
+        out = osmnames_to_schema(place)
 
     elif conf.GEOCODER == 'maptiler':
-        language = 'en'
-        url = f'https://api.maptiler.com/geocoding/{location_name}.json?language={language}&key={MAPTILER_KEY}'
-        place = requests.get(url=url, headers={'Origin': 'reca-api.herokuapp.com'})  # TODO move this to a setting?
-        place = place.json()['features'][0]
-        out = maptiler_to_schema(place)
+        features = get_client().search(location_name, language=LANGUAGE)
+        out = _first_maptiler_place(features, location_name)
 
     else:
         raise ValueError(f"No valid geocoder selected. Set in climada_calc-config.yaml. Possible values: osmnames, nominatim_web. Current value: {conf.GEOCODER}")
@@ -109,6 +211,28 @@ def location_from_name(location_name):
     return out
 
 
+async def alocation_from_name(location_name):
+    return await _acached_place('name', location_name, _alocation_from_name)
+
+
+async def _alocation_from_name(location_name):
+    if conf.GEOCODER == 'nominatim_web':
+        out = osmnames_to_schema(await get_client().asearch(location_name))
+    elif conf.GEOCODER == 'maptiler':
+        out = _first_maptiler_place(await get_client().asearch(location_name, language=LANGUAGE), location_name)
+    else:
+        return await run_sync(_location_from_name, location_name)
+
+    LOGGER.debug(f'Geocoding location with {conf.GEOCODER}.\n    Input: {location_name}\n    Found: {out.name}')
+    return out
+
+
+def _first_maptiler_place(features, query):
+    if len(features) == 0:
+        raise PlaceNotFoundError(f'Could not identify a place corresponding to {query}')
+    return maptiler_to_schema(features[0])
+
+
 def osmnames_to_schema(place):
     bbox = [round(x, PRECISION) for x in place['boundingbox']]
     poly = bbox_to_coords(bbox)
@@ -209,19 +333,10 @@ def _get_country_from_matching_name(name: str):
 
 
 def query_place(s):
-    if conf.GEOCODER == 'osmnames':
-        query = GEOCODE_URL + "q/" + s
-        response = requests.get(query).json()['results']
-    elif conf.GEOCODER == 'nominatim_web':
-        query = f'https://nominatim.openstreetmap.org/search?q={s}&format=json'
-        response = requests.get(query).json()
-    elif conf.GEOCODER == 'maptiler':
-        language = 'en'
-        query = f'https://api.maptiler.com/geocoding/{s}.json?language={language}&key={MAPTILER_KEY}'
-        response = requests.get(query, headers={'Origin': 'reca-api.herokuapp.com'}).json()['features']
+    if conf.GEOCODER == 'maptiler':
+        response = get_client().search(s, language=LANGUAGE)
     else:
-        ValueError(
-            f"No valid geocoder selected. Set in climada_calc-config.yaml. Possible values: osmnames, nominatim_web. Current value: {conf.GEOCODER}")
+        response = get_client().search(s)
     if len(response) == 0:
         return None
     else:
@@ -236,8 +351,8 @@ def get_one_place(s, exact=True):
     if len(db_location) == 1:
         return GeocodePlaceList(data=[GeocodePlace.from_location_model(db_location[0])])
     response = query_place(s)
-    if len(response) == 0:
-        raise ValueError(f'Could not identify a place corresponding to {s}')
+    if not response:
+        raise PlaceNotFoundError(f'Could not identify a place corresponding to {s}')
 
     if hasattr(response[0], 'display_name'):
         exact_response = [r for r in response if r['display_name'] == s]
@@ -278,17 +393,60 @@ def get_place_hierarchy(s, exact=True):
     return GeocodePlaceList(data=out)
 
 
-# TODO there's no real reason to have this separate from query_place is there?
 def geocode_autocomplete(s):
-    # TODO fix the location model so this works!!
-    db_location = Location.objects.filter(name=s)
-    if len(db_location) == 1:
-        return GeocodePlaceList(data=[GeocodePlace.from_location_model(db_location[0])])
-    db_location = Location.objects.filter(id=s)
-    if len(db_location) == 1:
-        return GeocodePlaceList(data=[GeocodePlace.from_location_model(db_location[0])])
+    """
+    Suggest places for a partial name. Suggestions come from the local Location index, and the geocoder is only
+    asked when there aren't enough of them. Geocoder calls are coalesced across concurrent and successive
+    keystrokes by REMOTE_SUGGESTIONS.
+    """
+    suggestions = AUTOCOMPLETE_INDEX.search(s, limit=conf.AUTOCOMPLETE_MAX_RESULTS)
+    if len(suggestions) >= conf.AUTOCOMPLETE_MIN_LOCAL_RESULTS:
+        return GeocodePlaceList(data=suggestions)
+
+    known = {place.name for place in suggestions}
+    remote = REMOTE_SUGGESTIONS.get(s, lambda: _cached_autocomplete(s).data)
+    remote = [place for place in remote if place.name not in known]
+    return GeocodePlaceList(data=(suggestions + remote)[:conf.AUTOCOMPLETE_MAX_RESULTS])
+
+
+async def ageocode_autocomplete(s):
+    suggestions = await run_sync(AUTOCOMPLETE_INDEX.search, s, limit=conf.AUTOCOMPLETE_MAX_RESULTS)
+    if len(suggestions) >= conf.AUTOCOMPLETE_MIN_LOCAL_RESULTS:
+        return GeocodePlaceList(data=suggestions)
+
+    known = {place.name for place in suggestions}
+    remote = await REMOTE_SUGGESTIONS.aget(s, lambda: _acached_autocomplete(s))
+    remote = [place for place in remote if place.name not in known]
+    return GeocodePlaceList(data=(suggestions + remote)[:conf.AUTOCOMPLETE_MAX_RESULTS])
+
+
+async def _acached_autocomplete(s):
+    key = GEOCODE_CACHE.make_key(conf.GEOCODER, 'autocomplete', s, LANGUAGE)
+    suggestions = await run_sync(GEOCODE_CACHE.get, key)
+    if suggestions is not None:
+        return GeocodePlaceList(**suggestions).data
+    kwargs = {'language': LANGUAGE} if conf.GEOCODER == 'maptiler' else {}
+    suggestions = _suggestions_to_schema(await get_client().asearch(s, **kwargs))
+    await run_sync(GEOCODE_CACHE.set, key, suggestions.dict())
+    return suggestions.data
+
+
+def _cached_autocomplete(s):
+    key = GEOCODE_CACHE.make_key(conf.GEOCODER, 'autocomplete', s, LANGUAGE)
+    suggestions = GEOCODE_CACHE.get(key)
+    if suggestions is None:
+        suggestions = _geocode_autocomplete(s)
+        GEOCODE_CACHE.set(key, suggestions.dict())
+        return suggestions
+    return GeocodePlaceList(**suggestions)
 
-    response = query_place(s)
+
+# TODO there's no real reason to have this separate from query_place is there?
+def _geocode_autocomplete(s):
+    return _suggestions_to_schema(query_place(s))
+
+
+def _suggestions_to_schema(response):
     if not response:
         return GeocodePlaceList(data=[])
     if conf.GEOCODER in ['osmnames', 'nominatim_web']:
@@ -300,6 +458,17 @@ def geocode_autocomplete(s):
     return GeocodePlaceList(data=suggestions)
 
 
-def geocode_precalculated_locations():
-    return GeocodePlaceList(data=[GeocodePlace.from_location_model(place) for place in Location.objects.all()])
-
+def reverse_geocode(lat=None, lon=None, bbox=None, max_distance=None):
+    """The precalculated location at a point or box, from the in-memory spatial index. No geocoder is called"""
+    if bbox is not None:
+        if len(bbox) != 4:
+            raise RequestValidationError(
+                f'bbox must be four numbers: min_lon, min_lat, max_lon, max_lat. Received {bbox}')
+        place = SPATIAL_INDEX.reverse_bbox(bbox, max_distance)
+    elif lat is not None and lon is not None:
+        place = SPATIAL_INDEX.reverse(lon, lat, max_distance)
+    else:
+        raise RequestValidationError('Reverse geocoding requires lat and lon, or a bbox')
+    if place is None:
+        raise PlaceNotFoundError(f'No precalculated location near {bbox if bbox is not None else (lat, lon)}')
+    return place
@@ -0,0 +1,69 @@
+import datetime
+import logging
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.vizz.models import GeocodeCache
+
+conf = ClimadaCalcApiConfig()
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+# Returned by get_stored_place when we've previously been told the place doesn't exist
+NOT_FOUND = 'NOT_FOUND'
+
+
+def get_stored_place(provider, lookup, query, language):
+    """
+    Get an unexpired geocoding result from the GeocodeCache table. Returns a GeocodePlace dict, NOT_FOUND for a
+    cached negative answer, or None if there's nothing stored.
+    """
+    try:
+        row = GeocodeCache.objects.filter(
+            provider=provider,
+            lookup=lookup,
+            query=query,
+            language=language,
+            expires_at__gt=timezone.now()
+        ).first()
+    except DatabaseError as e:
+        LOGGER.warning(f'Could not read the geocoding cache table: {e}')
+        return None
+    if not row:
+        return None
+    return row.result if row.found else NOT_FOUND
+
+
+def negative_ttl(place):
+    """The cache timeout for a 'not found' answer, or None for a place (caches then use their own timeout)"""
+    return conf.GEOCODE_CACHE_NEGATIVE_TTL if place is None or place == NOT_FOUND else None
+
+
+def store_place(provider, lookup, query, language, place: dict = None):
+    """Persist a GeocodePlace dict, or a 'not found' answer when place is None"""
+    if not conf.GEOCODE_CACHE_PERSIST:
+        return
+    ttl = negative_ttl(place) or conf.GEOCODE_CACHE_TTL
+    try:
+        GeocodeCache.objects.update_or_create(
+            provider=provider,
+            lookup=lookup,
+            query=query,
+            language=language,
+            defaults={
+                'found': place is not None,
+                'result': place,
+                'expires_at': timezone.now() + datetime.timedelta(seconds=ttl)
+            }
+        )
+    except DatabaseError as e:
+        # The cache is an optimisation: don't fail the request if we can't write to it
+        LOGGER.warning(f'Could not store geocoding result for {query}: {e}')
+
+
+def prune_expired():
+    n_deleted, _ = GeocodeCache.objects.filter(expires_at__lte=timezone.now()).delete()
+    return n_deleted
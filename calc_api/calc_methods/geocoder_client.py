@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import threading
+import weakref
+from urllib.parse import quote
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from climada_calc.settings import GEOCODE_URL, MAPTILER_KEY
+from calc_api.config import ClimadaCalcApiConfig
+
+conf = ClimadaCalcApiConfig()
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+
+class GeocoderUnavailableError(LookupError):
+    pass
+
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class GeocoderClient:
+    """
+    HTTP client for one geocoding provider. Holds a requests Session (and an httpx AsyncClient for each event loop
+    that uses it) so connections are pooled and kept alive between queries, with timeouts and retries from
+    climada_calc-config.yaml. Subclasses give the route for each kind of query and pick the list of raw results out
+    of the provider's response.
+
+    Point base_url at a local server implementing the same routes to run without the real provider.
+    """
+    name = None
+    default_base_url = None
+
+    def __init__(self, base_url=None, timeout=None, retries=None, backoff=None, pool_size=None):
+        self.base_url = base_url or self.default_base_url
+        if not self.base_url:
+            raise ValueError(f'No base URL configured for the {self.name} geocoder')
+        if not self.base_url.endswith('/'):
+            self.base_url += '/'
+        self.timeout = timeout if timeout is not None else (conf.GEOCODER_CONNECT_TIMEOUT, conf.GEOCODER_READ_TIMEOUT)
+        self.retries = conf.GEOCODER_RETRIES if retries is None else retries
+        self.backoff = conf.GEOCODER_BACKOFF if backoff is None else backoff
+        self.pool_size = conf.GEOCODER_POOL_SIZE if pool_size is None else pool_size
+        self.session = self._make_session(self.retries, self.backoff, self.pool_size)
+        # httpx clients can't be shared between event loops
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _make_session(self, retries, backoff, pool_size):
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET'],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(self.headers())
+        return session
+
+    def headers(self):
+        return {}
+
+    def get_json(self, path, params=None):
+        url = self.base_url + path
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise GeocoderUnavailableError(f'Geocoding request to {self.name} failed: {e}') from e
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            connect_timeout, read_timeout = self.timeout
+            client = httpx.AsyncClient(
+                headers=self.headers(),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.retries)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def aget_json(self, path, params=None):
+        url = self.base_url + path
+        client = self._async_client()
+        try:
+            for attempt in range(self.retries + 1):
+                response = await client.get(url, params=params)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    break
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise GeocoderUnavailableError(f'Geocoding request to {self.name} failed: {e}') from e
+
+    def search_route(self, s, **kwargs):
+        """The path and query parameters for a search, and a function to get the results from the response"""
+        raise NotImplementedError
+
+    def lookup_route(self, code):
+        return self.search_route(code)
+
+    def search(self, s, **kwargs):
+        path, params, get_results = self.search_route(s, **kwargs)
+        return get_results(self.get_json(path, params))
+
+    def lookup(self, code):
+        path, params, get_results = self.lookup_route(code)
+        return get_results(self.get_json(path, params))
+
+    async def asearch(self, s, **kwargs):
+        path, params, get_results = self.search_route(s, **kwargs)
+        return get_results(await self.aget_json(path, params))
+
+    async def alookup(self, code):
+        path, params, get_results = self.lookup_route(code)
+        return get_results(await self.aget_json(path, params))
+
+    def close(self):
+        self.session.close()
+
+
+class MaptilerClient(GeocoderClient):
+    name = 'maptiler'
+    default_base_url = 'https://api.maptiler.com/geocoding/'
+
+    def headers(self):
+        return {'Origin': conf.GEOCODER_ORIGIN}
+
+    def search_route(self, s, language='en'):
+        params = {'language': language, 'key': MAPTILER_KEY}
+        return f'{quote(str(s), safe="")}.json', params, lambda response: response['features']
+
+
+class NominatimClient(GeocoderClient):
+    name = 'nominatim_web'
+    default_base_url = 'https://nominatim.openstreetmap.org/'
+
+    def search_route(self, s):
+        return 'search', {'q': s, 'format': 'json'}, lambda response: response
+
+    def lookup_route(self, code):
+        return 'lookup', {'q': f'N{code}', 'format': 'json'}, lambda response: response
+
+
+class OsmnamesClient(GeocoderClient):
+    name = 'osmnames'
+    default_base_url = GEOCODE_URL
+
+    def search_route(self, s):
+        return f'q/{quote(str(s), safe="")}', None, lambda response: response['results']
+
+
+GEOCODER_CLIENTS = {
+    client.name: client for client in [MaptilerClient, NominatimClient, OsmnamesClient]
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(geocoder=None) -> GeocoderClient:
+    """The shared client for a geocoder (by default the one set in climada_calc-config.yaml)"""
+    geocoder = geocoder or conf.GEOCODER
+    client = _clients.get(geocoder)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(geocoder)
+            if client is None:
+                try:
+                    client_class = GEOCODER_CLIENTS[geocoder]
+                except KeyError:
+                    raise ValueError(f"No valid geocoder selected. Set in climada_calc-config.yaml. "
+                                     f"Possible values: {', '.join(GEOCODER_CLIENTS)}. Current value: {geocoder}") from None
+                client = client_class(base_url=conf.GEOCODER_BASE_URLS.get(geocoder))
+                _clients[geocoder] = client
+    return client
+
+
+def reset_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,90 @@
+"""
+Location geometry in binary form. Location.bbox and Location.poly stay the WKT source of truth. Alongside them we keep
+WKB copies, the bbox's bounds as plain columns and, in LocationPolygon, the polygon simplified to each resolution in
+the location-geometry config. Reading these needs no text parsing. Rows that haven't been built yet fall back to WKT.
+"""
+import logging
+from typing import Literal
+
+from shapely import wkb, wkt
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.cache import SharedVersion
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+FULL_RESOLUTION = 'full'
+
+# Bumped on every Location write, so that each worker rebuilds its in-memory location indexes
+LOCATIONS_VERSION = SharedVersion('locations:version')
+RESOLUTIONS = conf.LOCATION_RESOLUTIONS
+BOUNDS_FIELDS = ['min_lon', 'min_lat', 'max_lon', 'max_lat']
+
+
+def resolution_names():
+    return [FULL_RESOLUTION] + list(RESOLUTIONS)
+
+
+ResolutionOption = Literal[tuple(resolution_names())]
+
+
+def set_geometry(loc):
+    """Fill in a Location's binary geometry and bounds from its WKT. Doesn't save it"""
+    bbox = wkt.loads(loc.bbox) if loc.bbox else None
+    poly = wkt.loads(loc.poly) if loc.poly else None
+    loc.bbox_wkb = bbox.wkb if bbox else None
+    loc.poly_wkb = poly.wkb if poly else None
+    bounds = bbox.bounds if bbox else [None] * 4
+    for field, value in zip(BOUNDS_FIELDS, bounds):
+        setattr(loc, field, value)
+
+
+def simplified_polygons(loc, polygon_model):
+    """Unsaved polygon_model (LocationPolygon) rows for each simplified resolution of a Location's polygon"""
+    poly = location_poly(loc)
+    if poly is None:
+        return []
+    return [
+        polygon_model(location=loc, resolution=name, wkb=poly.simplify(tolerance, preserve_topology=True).wkb)
+        for name, tolerance in RESOLUTIONS.items()
+    ]
+
+
+def save_polygons(loc, polygon_model):
+    polygon_model.objects.filter(location=loc).delete()
+    polygon_model.objects.bulk_create(simplified_polygons(loc, polygon_model))
+
+
+def build_all(location_model, polygon_model, chunk_size=conf.CHUNK_SIZE):
+    """Build the binary geometry and simplified polygons of every Location. Takes models so migrations can use it"""
+    n_built = 0
+    for loc in location_model.objects.all().iterator(chunk_size=chunk_size):
+        set_geometry(loc)
+        location_model.objects.filter(pk=loc.pk).update(
+            bbox_wkb=loc.bbox_wkb, poly_wkb=loc.poly_wkb, **{field: getattr(loc, field) for field in BOUNDS_FIELDS})
+        save_polygons(loc, polygon_model)
+        n_built += 1
+    # update() sends no signals
+    LOCATIONS_VERSION.bump()
+    LOGGER.debug(f'Built geometry for {n_built} locations')
+    return n_built
+
+
+def location_bbox(loc):
+    """A Location's bbox as [min_lon, min_lat, max_lon, max_lat], or None"""
+    if loc.min_lon is not None:
+        return [loc.min_lon, loc.min_lat, loc.max_lon, loc.max_lat]
+    return list(wkt.loads(loc.bbox).bounds) if loc.bbox else None
+
+
+def location_poly(loc):
+    """A Location's polygon as a shapely geometry, or its bbox if it has no polygon, or None"""
+    if loc.poly_wkb is not None:
+        return wkb.loads(bytes(loc.poly_wkb))
+    if loc.poly:
+        return wkt.loads(loc.poly)
+    if loc.bbox_wkb is not None:
+        return wkb.loads(bytes(loc.bbox_wkb))
+    return wkt.loads(loc.bbox) if loc.bbox else None
@@ -0,0 +1,110 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Literal, get_args
+
+from shapely import wkb
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.util import RequestValidationError
+from calc_api.calc_methods import util
+from calc_api.calc_methods.location_geometry import (
+    FULL_RESOLUTION, LOCATIONS_VERSION, location_bbox, location_poly, resolution_names)
+from calc_api.vizz.models import Location, LocationPolygon
+from calc_api.vizz.schemas_geocoding import GeocodePlace, GeocodePlaceList
+from calc_api.job_management.response_cache import render_response
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+# full: bbox and polygon. bbox: bbox only. none: names and codes only
+GeometryOption = Literal['full', 'bbox', 'none']
+GEOMETRY_OPTIONS = list(get_args(GeometryOption))
+
+MAX_VARIANTS = 32
+
+PLACE_FIELDS = ["name", "id", "scale", "country", "country_id", "admin1", "admin1_id", "admin2", "admin2_id"]
+
+
+class PrecalculatedLocations:
+    """
+    The serialised list of locations with precalculated data. Location rows and their geometry are read once, on
+    first use, and each geometry option, resolution and simplification tolerance is serialised once. Reloaded when
+    LOCATIONS_VERSION changes, i.e. after a Location write in any process.
+    """
+
+    def __init__(self):
+        self._places = None
+        self._version = None
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load():
+        polygons = defaultdict(dict)
+        for location_id, resolution, poly in LocationPolygon.objects.values_list('location_id', 'resolution', 'wkb'):
+            polygons[location_id][resolution] = wkb.loads(bytes(poly))
+        places = []
+        for loc in Location.objects.all():
+            levels = dict(polygons[loc.pk], **{FULL_RESOLUTION: location_poly(loc)})
+            places.append(({field: getattr(loc, field) for field in PLACE_FIELDS}, location_bbox(loc), levels))
+        LOGGER.debug(f'Loaded {len(places)} precalculated locations')
+        return places
+
+    @property
+    def places(self):
+        version = LOCATIONS_VERSION.get()
+        places = self._places
+        if places is None or self._version != version:
+            with self._lock:
+                if self._places is None or self._version != version:
+                    self._places, self._version, self._bodies = self._load(), version, {}
+                places = self._places
+        return places
+
+    @staticmethod
+    def _place(fields, bbox, levels, geometry, resolution, simplify):
+        if geometry == 'none':
+            return GeocodePlace(**fields)
+        # Locations whose simplified polygons haven't been built yet are served at full resolution
+        poly = levels.get(resolution, levels[FULL_RESOLUTION])
+        if geometry == 'bbox' or poly is None:
+            return GeocodePlace(**fields, bbox=bbox)
+        if simplify:
+            poly = poly.simplify(simplify, preserve_topology=True)
+        return GeocodePlace(**fields, bbox=bbox, poly=util.poly_to_coords(poly))
+
+    def body(self, geometry='full', resolution=FULL_RESOLUTION, simplify=None) -> bytes:
+        if geometry not in GEOMETRY_OPTIONS:
+            raise RequestValidationError(
+                f'Unknown geometry option {geometry}. Possible values: {", ".join(GEOMETRY_OPTIONS)}')
+        if resolution not in resolution_names():
+            raise RequestValidationError(
+                f'Unknown resolution {resolution}. Possible values: {", ".join(resolution_names())}')
+        if simplify is not None and simplify < 0:
+            raise RequestValidationError(f'The simplify tolerance must be positive. Received {simplify}')
+        key = (geometry, resolution, simplify) if geometry == 'full' else (geometry, None, None)
+        # Reads the places first: that drops the bodies if the Location table has changed
+        places = self.places
+        body = self._bodies.get(key)
+        if body is None:
+            body = render_response(GeocodePlaceList(
+                data=[self._place(*place, geometry, resolution, simplify) for place in places]
+            ))
+            with self._lock:
+                # Don't cache bodies built from a list that was invalidated while we were serialising
+                if self._places is places:
+                    if len(self._bodies) >= MAX_VARIANTS:
+                        self._bodies.clear()
+                    self._bodies[key] = body
+        return body
+
+    def invalidate(self):
+        with self._lock:
+            self._places = None
+            self._version = None
+            self._bodies = {}
+
+
+PRECALCULATED_LOCATIONS = PrecalculatedLocations()
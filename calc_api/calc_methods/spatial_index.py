@@ -0,0 +1,104 @@
+import logging
+import threading
+
+import numpy as np
+import shapely
+from shapely.geometry import Point, box
+from shapely.strtree import STRtree
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.calc_methods.location_geometry import LOCATIONS_VERSION, location_poly
+from calc_api.vizz.models import Location
+from calc_api.vizz.schemas_geocoding import GeocodePlace
+
+conf = ClimadaCalcApiConfig()
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+
+class LocationSpatialIndex:
+    """
+    An STRtree over the polygons (or bboxes) of the Location table, for reverse geocoding without a geocoder. Built on
+    first use and rebuilt on the next query after LOCATIONS_VERSION changes, i.e. after a Location write in any
+    worker. Distances are in degrees.
+    """
+
+    def __init__(self, max_distance=0.5):
+        self.max_distance = max_distance
+        self._places = []
+        self._geoms = None
+        self._areas = None
+        self._tree = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._version = None
+
+    def _build(self, version):
+        places, geoms = [], []
+        for loc in Location.objects.all():
+            try:
+                geom = location_poly(loc)
+                if geom is None or geom.is_empty:
+                    continue
+                place = GeocodePlace.from_location_model(loc)
+            except Exception as e:
+                LOGGER.warning(f'Leaving location {loc.name} out of the spatial index: {e}')
+                continue
+            places.append(place)
+            geoms.append(geom)
+
+        geoms = np.array(geoms, dtype=object)
+        shapely.prepare(geoms)
+        self._places, self._geoms, self._areas = places, geoms, shapely.area(geoms)
+        self._tree = STRtree(geoms)
+        self._version = version
+        LOGGER.debug(f'Built spatial index over {len(places)} locations')
+
+    def _ensure_built(self):
+        version = LOCATIONS_VERSION.get()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._build(version)
+
+    def containing(self, lon, lat):
+        """Places whose polygon contains the point, smallest (most specific) first"""
+        self._ensure_built()
+        indices = self._tree.query(Point(lon, lat), predicate='intersects')
+        return [self._places[i] for i in sorted(indices, key=lambda i: self._areas[i])]
+
+    def intersecting(self, bbox):
+        """Places whose polygon overlaps a [min_lon, min_lat, max_lon, max_lat] box, largest overlap first"""
+        self._ensure_built()
+        query = box(*bbox)
+        indices = self._tree.query(query, predicate='intersects')
+        overlaps = shapely.area(shapely.intersection(self._geoms[indices], query)) if len(indices) else []
+        ranked = sorted(zip(indices, overlaps), key=lambda pair: (-pair[1], self._areas[pair[0]]))
+        return [self._places[i] for i, _ in ranked]
+
+    def nearest(self, geom, max_distance=None):
+        """The place closest to a geometry, if there's one within max_distance, else None"""
+        self._ensure_built()
+        if not self._places:
+            return None
+        max_distance = self.max_distance if max_distance is None else max_distance
+        indices = self._tree.query_nearest(geom, max_distance=max_distance)
+        if not len(indices):
+            return None
+        return self._places[min(indices, key=lambda i: self._areas[i])]
+
+    def reverse(self, lon, lat, max_distance=None):
+        """The most specific place containing a point, or failing that the nearest place"""
+        places = self.containing(lon, lat)
+        return places[0] if places else self.nearest(Point(lon, lat), max_distance)
+
+    def reverse_bbox(self, bbox, max_distance=None):
+        """The place overlapping most of a box, or failing that the place nearest to it"""
+        places = self.intersecting(bbox)
+        return places[0] if places else self.nearest(box(*bbox), max_distance)
+
+
+SPATIAL_INDEX = LocationSpatialIndex(max_distance=conf.SPATIAL_INDEX_MAX_DISTANCE)
@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 from shapely.geometry import Polygon
 from shapely import wkt
 import numpy as np
@@ -6,6 +7,7 @@ import pycountry
 import re
 
 from calc_api.config import ClimadaCalcApiConfig
+from calc_api.util import RequestValidationError
 from calc_api.vizz.enums import SCENARIO_LOOKUPS
 
 conf = ClimadaCalcApiConfig()
@@ -18,7 +20,7 @@ LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
 def standardise_scenario(scenario_name=None, scenario_growth=None, scenario_climate=None, scenario_year=None):
 
     if not scenario_name and (scenario_climate is None or scenario_growth is None):
-        raise ValueError('When scenario_name is not set, scenario_climate and scenario_growth must be')
+        raise RequestValidationError('When scenario_name is not set, scenario_climate and scenario_growth must be')
 
     if scenario_year and int(scenario_year) == 2020:
         return 'historical', 'historical', 'historical'
@@ -68,6 +70,73 @@ def bbox_to_wkt(bbox):
     return bbox_to_poly(bbox).wkt
 
 
+# Regions outside ISO 3166, with codes in its "user-assigned" range. Also STOLEN from climada.util.coordinates
+NONISO_REGIONS = [
+    dict(name="Akrotiri", alpha_2="XA", alpha_3="XXA", numeric="901"),
+    dict(name="Baikonur", alpha_2="XB", alpha_3="XXB", numeric="902"),
+    dict(name="Bajo Nuevo Bank", alpha_2="XR", alpha_3="XXR", numeric="903"),
+    dict(name="Clipperton Island", alpha_2="XL", alpha_3="XXL", numeric="904"),
+    dict(name="Coral Sea Islands", alpha_2="XC", alpha_3="XXC", numeric="905"),
+    dict(name="Cyprus UN Buffer Zone", alpha_2="XZ", alpha_3="XXZ", numeric="906"),
+    dict(name="Dhekelia", alpha_2="XD", alpha_3="XXD", numeric="907"),
+    dict(name="Indian Ocean Territories", alpha_2="XI", alpha_3="XXI", numeric="908"),
+    dict(name="Kosovo", alpha_2="XK", alpha_3="XKX", numeric="983"),
+    dict(name="Northern Cyprus", alpha_2="XY", alpha_3="XXY", numeric="909"),
+    dict(name="Scarborough Reef", alpha_2="XS", alpha_3="XXS", numeric="910"),
+    dict(name="Serranilla Bank", alpha_2="XP", alpha_3="XXP", numeric="911"),
+    dict(name="Siachen Glacier", alpha_2="XH", alpha_3="XXH", numeric="912"),
+    dict(name="Somaliland", alpha_2="XM", alpha_3="XXM", numeric="913"),
+    dict(name="Spratly Islands", alpha_2="XN", alpha_3="XXN", numeric="914"),
+    dict(name="USNB Guantanamo Bay", alpha_2="XG", alpha_3="XXG", numeric="915"),
+]
+
+# Identifiers a country can be looked up by, in the order pycountry's lookup tries them
+COUNTRY_ALIAS_FIELDS = ['alpha_2', 'alpha_3', 'alpha_4', 'name', 'numeric', 'official_name', 'common_name']
+COUNTRY_NAME_FIELDS = ['name', 'official_name', 'common_name']
+ISO_REPRESENTATIONS = ['alpha_2', 'alpha_3', 'numeric', 'name']
+
+
+@lru_cache(maxsize=None)
+def get_country_index():
+    """
+    Map every lower-cased identifier of every country to a record of its ISO representations. Built on first use.
+    Current countries take precedence over historic ones, and those over NONISO_REGIONS, as they did when we asked
+    pycountry in turn.
+    Names also get an entry with "the " added or removed, at the lowest precedence, so "The Gambia" finds Gambia.
+    """
+    sources = [
+        [country._fields for country in pycountry.countries],
+        [country._fields for country in pycountry.historic_countries],
+        NONISO_REGIONS
+    ]
+    index, the_variants = {}, {}
+    for source in sources:
+        for field in COUNTRY_ALIAS_FIELDS:
+            # Within one of pycountry's databases the last record with an identifier wins, e.g. CS
+            field_index = {}
+            for fields in source:
+                value = fields.get(field)
+                if not value:
+                    continue
+                record = {representation: fields.get(representation) for representation in ISO_REPRESENTATIONS}
+                field_index[value.lower()] = record
+                if field in COUNTRY_NAME_FIELDS:
+                    alias = value.lower()
+                    the_variants.setdefault(alias[4:] if alias.startswith('the ') else 'the ' + alias, record)
+            for alias, record in field_index.items():
+                index.setdefault(alias, record)
+    for alias, record in the_variants.items():
+        index.setdefault(alias, record)
+    return index
+
+
+@lru_cache(maxsize=None)
+def _iso_representation(representation):
+    if not re.match(r"(alpha[-_]?[23]|numeric|name)", representation):
+        raise ValueError(f"Unknown ISO representation: {representation}")
+    return re.sub(r"alpha-?([23])", r"alpha_\1", representation)
+
+
 # STOLEN from climada.util.coordinates so I don't have to import CLIMADA for this
 def country_to_iso(countries, representation="alpha3", fillvalue=None):
     """Determine ISO 3166 representation of countries
@@ -108,29 +177,20 @@ def country_to_iso(countries, representation="alpha3", fillvalue=None):
     return_single = np.isscalar(countries)
     countries = [countries] if return_single else countries
 
-    if not re.match(r"(alpha[-_]?[23]|numeric|name)", representation):
-        raise ValueError(f"Unknown ISO representation: {representation}")
-    representation = re.sub(r"alpha-?([23])", r"alpha_\1", representation)
-
-    iso_list = []
-    for country in countries:
-        country = country if isinstance(country, str) else f"{int(country):03d}"
-        try:
-            match = pycountry.countries.lookup(country)
-        except LookupError:
-            try:
-                match = pycountry.historic_countries.lookup(country)
-            except LookupError:
-                match = next(filter(lambda c: country in c.values(), NONISO_REGIONS), None)
-                if match is not None:
-                    match = pycountry.db.Data(**match)
-                elif fillvalue is not None:
-                    match = pycountry.db.Data(**{representation: fillvalue})
-                else:
-                    raise LookupError(f'Unknown country identifier: {country}') from None
-        iso = getattr(match, representation)
-        if representation == "numeric":
-            iso = int(iso)
-        iso_list.append(iso)
+    representation = _iso_representation(representation)
+    iso_list = [_country_to_iso(country, representation, fillvalue) for country in countries]
     return iso_list[0] if return_single else iso_list
 
+
+def _country_to_iso(country, representation, fillvalue):
+    country = country if isinstance(country, str) else f"{int(country):03d}"
+    record = get_country_index().get(country.lower())
+    # Some historic countries lack some representations, e.g. a numeric code
+    iso = record[representation] if record is not None else None
+    if iso is None:
+        if fillvalue is None:
+            raise LookupError(f'Unknown country identifier: {country}')
+        iso = fillvalue
+    if representation == "numeric":
+        iso = int(iso)
+    return iso
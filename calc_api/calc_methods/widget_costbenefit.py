@@ -4,12 +4,15 @@ from calc_api.config import ClimadaCalcApiConfig
 from calc_api.vizz import schemas
 import calc_api.vizz.models as models
 from calc_api.vizz import units
+from calc_api.cache import get_endpoint_cache
 
 conf = ClimadaCalcApiConfig()
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
 
+MEASURES_CACHE = get_endpoint_cache('measures')
+
 
 def get_default_measures(
         measure_id: int = None,
@@ -66,6 +69,12 @@ def get_default_measures(
         request.units_distance = units.NATIVE_UNITS_CLIMADA['distance']
     units_dict['distance'] = request.units_distance
 
+    key = MEASURES_CACHE.make_key(request.measure_id, request.slug, request.hazard_type, request.exposure_type,
+                                  sorted(units_dict.items()))
+    cached_measures = MEASURES_CACHE.get(key)
+    if cached_measures is not None:
+        return [schemas.MeasureSchema(**m) for m in cached_measures]
+
     measures = models.Measure.objects.filter(user_generated=False)
     if request.measure_id:
         measures = measures.filter(id=request.measure_id)
@@ -77,4 +86,5 @@ def get_default_measures(
         measures = measures.filter(exposure_type=request.exposure_type)
     measures_list = [schemas.MeasureSchema(**m.__dict__) for m in measures]
     _ = [measure.convert_units(units_dict) for measure in measures_list]
+    MEASURES_CACHE.set(key, [measure.dict() for measure in measures_list])
     return measures_list
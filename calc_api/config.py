@@ -1,4 +1,7 @@
+import os
+import threading
 from pathlib import Path
+from types import MappingProxyType
 
 import yaml
 
@@ -18,15 +21,84 @@ def human_to_int(hsize):
         raise ValueError('cannot parse size from {hsize}')
 
 
+ENV_PREFIX = 'CLIMADA_CALC_'
+
+
+def _coerce(value: str, current):
+    """Parse an environment variable override as YAML, then as the type of the setting it replaces"""
+    parsed = yaml.safe_load(value)
+    if isinstance(current, Path):
+        return Path(parsed)
+    if isinstance(current, bool) or current is None:
+        return parsed
+    if isinstance(current, (int, float)):
+        return type(current)(human_to_int(parsed) if isinstance(parsed, str) else parsed)
+    if isinstance(current, str):
+        return value
+    if not isinstance(parsed, type(current)):
+        raise ValueError(f'Expected a YAML {type(current).__name__}, received {value}')
+    return parsed
+
+
+def _freeze(value):
+    """A read-only copy of a setting: dicts become MappingProxyTypes and lists tuples, all the way down"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
 class ClimadaCalcApiConfig:
+    """
+    Settings from climada_calc-config.yaml. There's one instance per process: the file is parsed the first time the
+    class is instantiated and every later ClimadaCalcApiConfig() returns the same read-only object, with read-only
+    mappings and tuples in place of dicts and lists. Any setting can be overridden with an environment variable named
+    CLIMADA_CALC_<SETTING>, e.g. CLIMADA_CALC_DATABASE_MODE=update.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._load()
+                    cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        # Everything happens once, in __new__
+        pass
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError(f'The config is read-only: override {name} with {ENV_PREFIX}{name} instead')
+        super().__setattr__(name, value)
 
     def read_config(self):
         with open(BASE_DIR / 'climada_calc-config.yaml') as stream:
             cdac = yaml.safe_load(stream)
             return cdac
 
-    def __init__(self):
-        cdac = self.read_config()
+    def _load(self):
+        self.__dict__.clear()
+        self._set_from_yaml(self.read_config())
+        for name, current in list(self.__dict__.items()):
+            if ENV_PREFIX + name in os.environ:
+                setattr(self, name, _coerce(os.environ[ENV_PREFIX + name], current))
+        for name, value in list(self.__dict__.items()):
+            setattr(self, name, _freeze(value))
+        self._frozen = True
+
+    def reload(self):
+        """Re-read the file and the environment, in place. Values other modules derived from the config are kept"""
+        with self._instance_lock:
+            self.__dict__['_frozen'] = False
+            self._load()
+
+    def _set_from_yaml(self, cdac):
         self.LOG_LEVEL = cdac['log_level']
         self.DATA_ROOT = Path(cdac['data']['path-root'])
         self.DATA_URL = cdac['data']['url-root']
@@ -36,11 +108,18 @@ class ClimadaCalcApiConfig:
         self.TEMP_FILE = Path(cdac['test']['tmp'])
         self.API_URL = cdac['rest']['url-root']
         self.CHUNK_SIZE = human_to_int(cdac['chunk-size'])
+        self.SPATIAL_INDEX_MAX_DISTANCE = float(cdac['spatial-index']['max-distance'])
+        self.LOCATION_RESOLUTIONS = {
+            name: float(tolerance) for name, tolerance in cdac['location-geometry']['resolutions'].items()
+        }
         self.LOGO_LINK = cdac['climada-logo']['link']
         self.LOGO_SRC = cdac['climada-logo']['img-src']
         self.REPOSITORY_URL = cdac['repository_url']
         self.DEFAULT_LICENSE = cdac['defaults']['data-license']
         self.LOCK_TIMEOUT = int(cdac['lock-timeout'])
+        self.IMPORT_BUDGET = int(cdac['startup']['import-budget'])
+        self.UNIT_REGISTRY_CACHE = Path(cdac['startup']['unit-registry-cache']) \
+            if cdac['startup']['unit-registry-cache'] else None
         self.DEFAULT_UNITS = {
             var: cdac['defaults']['units'][var]
             for var in ['temperature', 'distance', 'speed', 'area', 'currency', "people", 'person-days']
@@ -51,5 +130,55 @@ class ClimadaCalcApiConfig:
         self.DEFAULT_N_TRACKS = cdac['defaults']['api_parameters']['n_tracks']
         self.DEFAULT_MIN_DIST_TO_CENTROIDS = float(cdac['defaults']['api_parameters']['min_dist_to_centroids'])
         self.CACHE_TIMEOUT = int(cdac['cache']['timeout'])
+        self.CACHE_ENDPOINT_TIMEOUTS = {
+            endpoint: int(timeout) for endpoint, timeout in cdac['cache']['endpoints'].items()
+        }
+        self.RESPONSE_CACHE_MAX_ENTRIES = int(cdac['cache']['responses']['max-entries'])
+        self.RESPONSE_CACHE_MAX_SIZE = human_to_int(cdac['cache']['responses']['max-size'])
+        self.GEOCODER_BASE_URLS = {
+            geocoder: url for geocoder, url in (cdac['geocoder-client']['base-urls'] or {}).items() if url
+        }
+        self.GEOCODER_ORIGIN = cdac['geocoder-client']['origin']
+        self.GEOCODER_CONNECT_TIMEOUT = float(cdac['geocoder-client']['connect-timeout'])
+        self.GEOCODER_READ_TIMEOUT = float(cdac['geocoder-client']['read-timeout'])
+        self.GEOCODER_RETRIES = int(cdac['geocoder-client']['retries'])
+        self.GEOCODER_BACKOFF = float(cdac['geocoder-client']['backoff'])
+        self.GEOCODER_POOL_SIZE = int(cdac['geocoder-client']['pool-size'])
+        self.AUTOCOMPLETE_MAX_RESULTS = int(cdac['autocomplete']['max-results'])
+        self.AUTOCOMPLETE_MIN_LOCAL_RESULTS = int(cdac['autocomplete']['min-local-results'])
+        self.AUTOCOMPLETE_MIN_SIMILARITY = float(cdac['autocomplete']['min-similarity'])
+        self.AUTOCOMPLETE_COALESCE_TTL = int(cdac['autocomplete']['coalesce-ttl'])
+        self.AUTOCOMPLETE_MIN_PREFIX_LENGTH = int(cdac['autocomplete']['min-prefix-length'])
+        self.GEOCODE_CACHE_PERSIST = bool(cdac['geocode-cache']['persist'])
+        self.GEOCODE_CACHE_TTL = int(cdac['geocode-cache']['ttl'])
+        self.GEOCODE_CACHE_NEGATIVE_TTL = int(cdac['geocode-cache']['negative-ttl'])
+        self.CURRENCY_PROVIDERS = list(cdac['currency']['providers'])
+        self.CURRENCY_RATES_FILE = Path(cdac['currency']['rates-file'])
+        self.CURRENCY_RATES_TTL = int(cdac['currency']['ttl'])
+        self.PRECOMPUTED_PATH = Path(cdac['precomputed']['path'])
+        self.BATCH_MAX_REQUESTS = int(cdac['batch']['max-requests'])
         self.JOB_TIMEOUT = int(cdac['job']['timeout'])
+        self.SERVER_MODE = cdac['server']['mode']
+        self.SERVER_BIND = cdac['server']['bind']
+        self.SERVER_WORKERS = int(cdac['server']['workers'])
+        self.SERVER_THREADS = int(cdac['server']['threads'])
+        self.SERVER_DB_CONNECTIONS = int(cdac['server']['db-connections'])
+        self.SERVER_TIMEOUT = int(cdac['server']['timeout'])
+        self.SERVER_GRACEFUL_TIMEOUT = int(cdac['server']['graceful-timeout'])
+        self.SERVER_KEEP_ALIVE = int(cdac['server']['keep-alive'])
+        self.SERVER_MAX_REQUESTS = int(cdac['server']['max-requests'])
+        self.SERVER_MAX_REQUESTS_JITTER = int(cdac['server']['max-requests-jitter'])
+        self.SERVER_PRELOAD = bool(cdac['server']['preload'])
+        self.SERVER_WARM_UP = bool(cdac['server']['warm-up'])
         self.DATABASE_MODE = cdac['database_mode']
+
+
+def get_config() -> ClimadaCalcApiConfig:
+    return ClimadaCalcApiConfig()
+
+
+def reload_config() -> ClimadaCalcApiConfig:
+    """For tests and long-running shells: pick up changes to climada_calc-config.yaml or CLIMADA_CALC_* variables"""
+    conf = ClimadaCalcApiConfig()
+    conf.reload()
+    return conf
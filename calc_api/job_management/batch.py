@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.util import RequestValidationError
+from calc_api.calc_methods.geocode import astandardise_location, PlaceNotFoundError
+from calc_api.calc_methods.geocoder_client import GeocoderUnavailableError
+from calc_api.vizz import units
+from calc_api.vizz.models import JobLog
+from calc_api.job_management.sync_executor import run_sync
+from calc_api.job_management.response_cache import (
+    get_cached_body, set_cached_body, native_job_hash, render_response, json_response, conversion_variant)
+from calc_api.job_management.precomputed import PRECOMPUTED_WIDGETS, precomputed_body
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+
+class BatchItemError(Exception):
+    """A request in a batch that can't be served. It's reported in its place in the results, not raised"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _geocoding_error(e):
+    # The codes the single-request endpoints answer with
+    if isinstance(e, PlaceNotFoundError):
+        return BatchItemError(404, str(e))
+    if isinstance(e, GeocoderUnavailableError):
+        return BatchItemError(503, str(e))
+    return BatchItemError(400, f'Could not geocode the location: {e}')
+
+
+def _location_key(request):
+    return request.location_name, request.location_code, request.location_scale, request.location_poly
+
+
+async def astandardise_batch(requests):
+    """
+    Standardise a list of requests, geocoding each distinct location once. Returns a list with None for each request
+    that standardised and a BatchItemError for each that didn't.
+    """
+    errors = [None] * len(requests)
+    by_location = defaultdict(list)
+    for i, request in enumerate(requests):
+        if request.needs_geocoding():
+            by_location[_location_key(request)].append(i)
+
+    keys = list(by_location)
+    places = await asyncio.gather(*(astandardise_location(*key) for key in keys), return_exceptions=True)
+    for key, place in zip(keys, places):
+        for i in by_location[key]:
+            if isinstance(place, Exception):
+                errors[i] = _geocoding_error(place)
+            else:
+                requests[i].set_geocoding(place)
+
+    await run_sync(_standardise_all, requests, errors)
+    return errors
+
+
+def _standardise_all(requests, errors):
+    for i, request in enumerate(requests):
+        if errors[i] is None:
+            try:
+                request.standardise()
+            except RequestValidationError as e:
+                errors[i] = BatchItemError(400, str(e))
+
+
+def _error_body(job_schema, location_root, request, error: BatchItemError) -> bytes:
+    job_id = str(request.get_id())
+    return render_response(job_schema(
+        job_id=job_id,
+        location=location_root + '/' + job_id,
+        status="FAILURE",
+        request={},
+        code=error.code,
+        message=error.message
+    ))
+
+
+def _joblog_body(job_schema, location_root, job: JobLog, requested_units) -> bytes:
+    # The same conversion as wrangle_endpoint_units, so these bodies can share response cache entries with it
+    result = job_schema.from_joblog(job, location_root)
+    if result.response:
+        result.response.convert_units(requested_units)
+    return render_response(result)
+
+
+def batch_widget_bodies(widget, requests, errors):
+    """
+    Serialised responses for a list of standardised widget requests, in order. Responses in the response cache are
+    served from it and precomputed hazards from the precomputed store. The rest share a single JobLog query, and
+    requests repeated within the batch are converted once.
+    """
+    job_schema, location_root = PRECOMPUTED_WIDGETS[widget]
+    bodies = [None] * len(requests)
+    pending, conversions = {}, {}
+    for i, request in enumerate(requests):
+        if errors[i] is not None:
+            continue
+        try:
+            requested_units = units.get_request_unittype_to_unitname_mapping(request)
+        except RequestValidationError as e:
+            errors[i] = BatchItemError(400, str(e))
+            continue
+        if request.hazard_type != 'tropical_cyclone':
+            try:
+                bodies[i] = precomputed_body(widget, request)
+            except LookupError as e:
+                errors[i] = BatchItemError(404, str(e))
+            continue
+        variant = conversion_variant(requested_units)
+        key = (str(native_job_hash(request)), tuple(sorted(variant.items())))
+        if key not in pending:
+            pending[key] = get_cached_body(key[0], variant)
+            conversions[key] = requested_units
+        bodies[i] = key
+
+    missing = {job_hash for (job_hash, _), body in pending.items() if body is None}
+    jobs = JobLog.objects.in_bulk(list(missing)) if missing else {}
+    for key, body in pending.items():
+        if body is not None:
+            continue
+        job_hash = key[0]
+        job = jobs.get(job_hash)
+        if job is None or job.result is None:
+            pending[key] = BatchItemError(404, f'No precalculated {widget} result for job {job_hash}')
+            continue
+        pending[key] = _joblog_body(job_schema, location_root, job, conversions[key])
+        set_cached_body(job_hash, dict(key[1]), pending[key])
+
+    for i, request in enumerate(requests):
+        if isinstance(bodies[i], tuple):
+            body = pending[bodies[i]]
+            if isinstance(body, BatchItemError):
+                errors[i], body = body, None
+            bodies[i] = body
+        if errors[i] is not None:
+            bodies[i] = _error_body(job_schema, location_root, request, errors[i])
+    return bodies
+
+
+async def abatch_widget_response(widget, requests):
+    """A JSON list of job responses for a list of widget requests, one for each request and in the same order"""
+    if len(requests) > conf.BATCH_MAX_REQUESTS:
+        raise RequestValidationError(
+            f'Too many requests in one batch: {len(requests)}. The limit is {conf.BATCH_MAX_REQUESTS}')
+    errors = await astandardise_batch(requests)
+    bodies = await run_sync(batch_widget_bodies, widget, requests, errors)
+    n_errors = sum(error is not None for error in errors)
+    LOGGER.debug(f'Served a batch of {len(requests)} {widget} requests with {n_errors} errors')
+    return json_response(b'[' + b', '.join(bodies) + b']')
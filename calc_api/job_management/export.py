@@ -0,0 +1,68 @@
+"""
+Streaming exports of precalculated JobLog results as NDJSON: one JSON object per line, per JobLog row. Rows are read
+with a server-side cursor (on Postgres) in chunks of conf.CHUNK_SIZE, so memory use doesn't grow with the table.
+"""
+import json
+import logging
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.util import RequestValidationError
+from calc_api.vizz.models import JobLog
+from calc_api.vizz.schemas import load_joblog_result
+from calc_api.job_management.joblog_results import WIDGET_JOB_SCHEMAS, response_schema
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+EXPORT_COLUMNS = ('job_hash', 'func', 'args', 'kwargs', 'result')
+
+
+def _any_in_args(field, values):
+    # JobLog doesn't store the request's fields in columns, so match the "field": "value" pairs in the serialised
+    # arguments, written compactly (as by util.encode) or with json.dumps' default separators
+    pairs = [json.dumps(field) + separator + json.dumps(value, ensure_ascii=False)
+             for value in values for separator in (':', ': ')]
+    return reduce(or_, [Q(args__contains=pair) for pair in pairs])
+
+
+def export_queryset(func=None, widget=None, hazard_types=None, location_codes=None):
+    """JobLog rows with results, optionally filtered. hazard_types and location_codes are lists matching any entry"""
+    jobs = JobLog.objects.filter(result__isnull=False)
+    if func:
+        jobs = jobs.filter(func=func)
+    if widget:
+        if widget not in WIDGET_JOB_SCHEMAS:
+            raise RequestValidationError(f'Unknown widget {widget}. Possible values: {", ".join(WIDGET_JOB_SCHEMAS)}')
+        # Only rows validated by validate_joblog_results know which widget they belong to
+        jobs = jobs.filter(result_schema=response_schema(WIDGET_JOB_SCHEMAS[widget]).__name__)
+    if hazard_types:
+        jobs = jobs.filter(_any_in_args('hazard_type', hazard_types))
+    if location_codes:
+        jobs = jobs.filter(_any_in_args('location_code', location_codes))
+    return jobs.order_by('job_hash')
+
+
+def ndjson_lines(jobs):
+    """Yield each row of a JobLog queryset as one line of NDJSON, as bytes"""
+    n_rows = 0
+    for row in jobs.values_list(*EXPORT_COLUMNS).iterator(chunk_size=conf.CHUNK_SIZE):
+        job = dict(zip(EXPORT_COLUMNS, row))
+        try:
+            job['result'] = load_joblog_result(job['result'])
+        except ValueError:
+            LOGGER.warning(f'Exporting the result of JobLog {job["job_hash"]} as a string: it isn\'t valid JSON')
+        n_rows += 1
+        yield json.dumps(job).encode('utf-8') + b'\n'
+    LOGGER.debug(f'Exported {n_rows} JobLog rows')
+
+
+def split_list(s):
+    """Parse a comma-separated query parameter"""
+    return [value.strip() for value in s.split(',') if value.strip()] if s else None
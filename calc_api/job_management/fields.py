@@ -0,0 +1,186 @@
+"""
+Sparse fieldsets for widget jobs. A request's fields parameter is a comma-separated list of dotted paths into the
+job's response, e.g. fields=data.chart.items,metadata. The job envelope (job_id, location, status, ...) is always
+included. Lists are transparent: data.text.template gives the template of every text block.
+"""
+import json
+
+from ninja import Schema
+from ninja.responses import NinjaJSONEncoder
+from pydantic import BaseModel, parse_obj_as
+from pydantic.fields import SHAPE_SINGLETON
+
+from calc_api.util import RequestValidationError
+from calc_api.vizz.models import JobLog
+from calc_api.vizz.schemas import ResponseSchema, load_joblog_result
+from calc_api.job_management.joblog_results import response_schema, render_envelope
+from calc_api.job_management.response_cache import json_response
+
+
+def parse_fields(fields):
+    if not fields:
+        return None
+    paths = sorted({tuple(p for p in path.strip().split('.') if p) for path in fields.split(',')} - {()})
+    return paths or None
+
+
+def fields_key(fields):
+    """A normalised form of the fields parameter, for cache keys"""
+    paths = parse_fields(fields)
+    return ','.join('.'.join(path) for path in paths) if paths else None
+
+
+def _model_field(model, name, path):
+    if not (isinstance(model, type) and issubclass(model, BaseModel)) or name not in model.__fields__:
+        available = ', '.join(model.__fields__) if isinstance(model, type) and issubclass(model, BaseModel) else 'none'
+        raise RequestValidationError(
+            f'Unknown field {".".join(path)} in the fields parameter. Fields available here: {available}')
+    return model.__fields__[name]
+
+
+def _is_container(model):
+    # Containers hold no units of their own, so converting their children one at a time is the same as converting them
+    return (
+        isinstance(model, type)
+        and issubclass(model, ResponseSchema)
+        and model.convert_units is ResponseSchema.convert_units
+        and not any(name.startswith('unit') for name in model.__fields__)
+    )
+
+
+def _check_path(model, path, prefix):
+    for i, name in enumerate(path):
+        model = _model_field(model, name, prefix + path[:i + 1]).type_
+
+
+def conversion_root(job_schema, path):
+    """
+    Split a path at the first node that isn't a plain container. Returns the path to that node and its type, which is
+    where unit conversion happens, and the rest of the path, which is only used to prune the converted subtree.
+    """
+    model = response_schema(job_schema)
+    for i, name in enumerate(path):
+        field = _model_field(model, name, path[:i + 1])
+        if field.shape != SHAPE_SINGLETON or not _is_container(field.type_):
+            _check_path(field.type_, path[i + 1:], path[:i + 1])
+            return path[:i + 1], field.outer_type_, path[i + 1:]
+        model = field.type_
+    return path, model, ()
+
+
+def _prune(value, path):
+    """The parts of value on the path, keeping their nesting. Lists apply the rest of the path to each entry"""
+    if not path or value is None:
+        return value
+    if isinstance(value, list):
+        return [_prune(entry, path) for entry in value]
+    if not isinstance(value, dict):
+        return None
+    return {path[0]: _prune(value.get(path[0]), path[1:])}
+
+
+def _nest(path, value):
+    for name in reversed(path):
+        value = {name: value}
+    return value
+
+
+def _merge(target, source):
+    """Merge pruned trees, e.g. {'a': [{'b': 1}]} and {'a': [{'c': 2}]} into {'a': [{'b': 1, 'c': 2}]}"""
+    if isinstance(target, dict) and isinstance(source, dict):
+        for key, value in source.items():
+            target[key] = _merge(target[key], value) if key in target else value
+        return target
+    if isinstance(target, list) and isinstance(source, list):
+        return [_merge(t, s) for t, s in zip(target, source)]
+    return source
+
+
+def _convert(value, requested_units):
+    if isinstance(value, ResponseSchema):
+        value.convert_units(requested_units)
+    elif isinstance(value, list):
+        _ = [_convert(entry, requested_units) for entry in value]
+
+
+def _to_json_data(value):
+    if isinstance(value, Schema):
+        return value.dict()
+    if isinstance(value, list):
+        return [_to_json_data(entry) for entry in value]
+    return value
+
+
+def select_fields(job_schema, paths, get_section, requested_units=None):
+    """
+    Build the part of a response named by the paths. get_section(path) returns the raw JSON at a path. Each subtree
+    is validated and unit-converted on its own, at its conversion root, and then pruned to the requested path.
+    """
+    roots = {}
+    for path in paths:
+        root, root_type, rest = conversion_root(job_schema, path)
+        roots.setdefault((root, root_type), []).append(rest)
+
+    response = {}
+    for (root, root_type), rests in roots.items():
+        raw = get_section(root)
+        if raw is None:
+            value = None
+        else:
+            value = parse_obj_as(root_type, raw)
+            if requested_units:
+                _convert(value, requested_units)
+            value = _to_json_data(value)
+        if () in rests:
+            response = _merge(response, _nest(root, value))
+            continue
+        for rest in rests:
+            response = _merge(response, _nest(root, _prune(value, rest)))
+    return response
+
+
+def _joblog_sections(job_hash, roots):
+    """
+    Extract the subtrees at each path from a JobLog result in the database, with JSON key transforms. Rows that still
+    store their result as a JSON string don't support these, so for them we load the whole result once.
+    """
+    lookups = ['result__' + '__'.join(root) for root in roots]
+    row = JobLog.objects.filter(job_hash=str(job_hash)).values_list('result__metadata__uri', *lookups).first()
+    if row is None:
+        raise JobLog.DoesNotExist(f'No JobLog with job hash {job_hash}')
+    uri, sections = row[0], dict(zip(roots, row[1:]))
+
+    if any(value is None for value in sections.values()):
+        result = JobLog.objects.filter(job_hash=str(job_hash)).values_list('result', flat=True).first()
+        if isinstance(result, str):
+            result = load_joblog_result(result)
+            uri = result.get('metadata', {}).get('uri')
+            for root in roots:
+                value = result
+                for name in root:
+                    value = value.get(name) if isinstance(value, dict) else None
+                sections[root] = value
+    return uri, sections
+
+
+def joblog_fields_response(job_schema, job_hash, location_root, fields, requested_units=None):
+    """A job response from a JobLog row containing only the requested fields"""
+    paths = parse_fields(fields)
+    roots = sorted({conversion_root(job_schema, path)[0] for path in paths})
+    uri, sections = _joblog_sections(job_hash, roots)
+    response = select_fields(job_schema, paths, sections.get, requested_units)
+    return json_response(render_envelope(str(job_hash), location_root, json.dumps(response, cls=NinjaJSONEncoder), uri))
+
+
+def prune_response_body(body: bytes, fields, job_schema):
+    """Cut an already-serialised job response down to the requested fields"""
+    paths = parse_fields(fields)
+    for path in paths:
+        conversion_root(job_schema, path)
+    job = json.loads(body)
+    if job['response'] is not None:
+        response = {}
+        for path in paths:
+            response = _merge(response, _prune(job['response'], path))
+        job['response'] = response
+    return json_response(json.dumps(job, cls=NinjaJSONEncoder).encode('utf-8'))
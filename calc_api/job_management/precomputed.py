@@ -0,0 +1,136 @@
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.vizz import schemas, schemas_widgets, units
+from calc_api.job_management.response_cache import render_response, json_response, conversion_variant
+from calc_api.job_management.fields import prune_response_body
+from climada_calc.settings import BASE_DIR
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+# Widgets with precomputed payloads: the job schema they're served as and the root of their job locations
+PRECOMPUTED_WIDGETS = {
+    'cost-benefit': (schemas_widgets.CostBenefitWidgetJobSchema, 'rest/vizz/widgets/cost-benefit'),
+    'risk-timeline': (schemas_widgets.TimelineWidgetJobSchema, 'rest/vizz/widgets/risk-timeline'),
+}
+
+MAX_UNIT_COMBINATIONS = 64
+
+# Payload files are named <hazard_type>.v<version>.json. The highest version is served
+PAYLOAD_FILENAME = re.compile(r'^(?P<hazard_type>[a-z_]+)\.v(?P<version>\d+)\.json$')
+
+
+class PrecomputedPayload:
+    """
+    A widget response stored in CLIMADA's native units. It's validated once when it's loaded, and serialised once
+    for each set of units it's requested in.
+    """
+
+    def __init__(self, widget, hazard_type, version, schema: schemas.JobSchema):
+        self.widget = widget
+        self.hazard_type = hazard_type
+        self.version = version
+        self.schema = schema
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, widget, hazard_type, version, path):
+        with open(path) as f:
+            result = json.load(f)
+        schema_class, location_root = PRECOMPUTED_WIDGETS[widget]
+        schema = schema_class(
+            job_id=result['job_id'],
+            location=location_root + '/' + result['job_id'],
+            status="SUCCESS",
+            request={},  # TODO work out where to get this from
+            completed_at=None,
+            expires_at=None,
+            response=result['response'],
+            response_uri=None,
+            code=None,
+            message=None
+        )
+        return cls(widget, hazard_type, version, schema)
+
+    def body(self, requested_units) -> bytes:
+        key = tuple(sorted(conversion_variant(requested_units).items()))
+        body = self._bodies.get(key)
+        if body is None:
+            result = self.schema.copy(deep=True)
+            if result.response:
+                result.response.convert_units(requested_units)
+            body = render_response(result)
+            with self._lock:
+                # There are only a handful of unit combinations, but don't let odd requests grow this forever
+                if len(self._bodies) >= MAX_UNIT_COMBINATIONS:
+                    self._bodies.clear()
+                self._bodies[key] = body
+        return body
+
+
+class PrecomputedPayloadStore:
+    """Precomputed widget payloads read from versioned files under one directory per widget, loaded on first use"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._payloads = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        payloads = {}
+        for widget in PRECOMPUTED_WIDGETS:
+            widget_dir = self.root / widget
+            if not widget_dir.is_dir():
+                continue
+            for path in widget_dir.iterdir():
+                match = PAYLOAD_FILENAME.match(path.name)
+                if not match:
+                    continue
+                key = (widget, match['hazard_type'])
+                version = int(match['version'])
+                if key in payloads and payloads[key].version > version:
+                    continue
+                payloads[key] = PrecomputedPayload.from_file(widget, match['hazard_type'], version, path)
+        LOGGER.debug(f'Loaded {len(payloads)} precomputed widget payloads from {self.root}')
+        return payloads
+
+    @property
+    def payloads(self):
+        if self._payloads is None:
+            with self._lock:
+                if self._payloads is None:
+                    self._payloads = self._load()
+        return self._payloads
+
+    def get(self, widget, hazard_type) -> PrecomputedPayload:
+        try:
+            return self.payloads[(widget, hazard_type)]
+        except KeyError:
+            raise LookupError(f'No precomputed {widget} data for hazard type {hazard_type}') from None
+
+    def reload(self):
+        with self._lock:
+            self._payloads = self._load()
+
+
+PRECOMPUTED = PrecomputedPayloadStore(Path(BASE_DIR, conf.PRECOMPUTED_PATH))
+
+
+def precomputed_body(widget, request) -> bytes:
+    requested_units = units.get_request_unittype_to_unitname_mapping(request)
+    return PRECOMPUTED.get(widget, request.hazard_type).body(requested_units)
+
+
+def precomputed_response(widget, request, fields=None):
+    """Serve a widget request from the precomputed store, in the units the request asks for"""
+    body = precomputed_body(widget, request)
+    if fields:
+        return prune_response_body(body, fields, PRECOMPUTED_WIDGETS[widget][0])
+    return json_response(body)
@@ -0,0 +1,69 @@
+"""
+Job hashes for request schemas. A job hash is the MD5 of util.encode(request): the request's fields and its class
+name as sorted, compact JSON, with the embedded geocoding (polygon and all) encoded the same way. JobLog rows are
+keyed by it, so the encoding can't change. request_key produces the same string piece by piece, without touching
+the request, and encodes the geocoding, which is most of the string, once per GeocodePlace. The key and the
+geocoding's JSON are cached on the objects and reused until one of their fields changes, in place or by assignment.
+"""
+import json
+
+from calc_api import util
+from calc_api.vizz.schemas_geocoding import GeocodePlace
+
+CLASS_KEY = '__class__'
+
+
+def _field_values(thing):
+    # A GeocodePlace is represented by its JSON, which is cached on the place and checked the same way
+    return [geocoding_json(value) if isinstance(value, GeocodePlace) else value
+            for name, value in thing.__dict__.items() if name != CLASS_KEY]
+
+
+def _snapshot(value):
+    # Copies of the lists and dicts in a field value that share their contents. Comparing the field values with it is
+    # then mostly identity checks, yet catches a list changed in place
+    if isinstance(value, list):
+        return [_snapshot(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    return value
+
+
+def _cached(thing, attr, build):
+    """build(thing), cached in thing's private attribute attr until one of thing's field values changes"""
+    values = _field_values(thing)
+    cached = getattr(thing, attr)
+    if cached is not None and values == cached[0]:
+        return cached[1]
+    snapshot = _snapshot(values)
+    built = build(thing)
+    object.__setattr__(thing, attr, (snapshot, built))
+    return built
+
+
+def _encode_value(value):
+    if isinstance(value, GeocodePlace):
+        return geocoding_json(value)
+    return json.dumps(value, **util.ENCODE_OPTIONS)
+
+
+def _encode_fields(thing):
+    fields = dict(thing.__dict__, **{CLASS_KEY: type(thing).__name__})
+    return '{' + ','.join(
+        json.dumps(name, ensure_ascii=False) + ':' + _encode_value(fields[name]) for name in sorted(fields)
+    ) + '}'
+
+
+def geocoding_json(place):
+    """util.encode(place) for a GeocodePlace, cached on the place"""
+    return _cached(place, '_key_json', util.encode)
+
+
+def request_json(request):
+    """util.encode(request) for a request schema, without mutating it"""
+    return _encode_fields(request)
+
+
+def request_key(request):
+    """The job hash of a request schema, equal to util.get_hash(request). Cached on the request"""
+    return _cached(request, '_request_key', lambda r: util.hash_dump(_encode_fields(r)))
@@ -0,0 +1,212 @@
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+from decorator import decorator
+from django.http import HttpResponse
+from ninja.responses import NinjaJSONEncoder
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.cache import get_endpoint_cache, shared_incr
+from calc_api.vizz import currency, units
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+# The job's own status comes first in a serialised job: only job_id and location precede it
+JOB_STATUS = re.compile(rb'"status": "(\w+)"')
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU of serialised widget responses, keyed by job hash, the job's version in the shared cache and the
+    units the response was converted to. Precalculated results don't change, so an entry is only dropped when it's
+    evicted or its JobLog row is written. A write in another process bumps the version, so entries for the old
+    version are never served again and age out of the LRU.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._keys_by_job = defaultdict(set)
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(job_hash, units_dict, version=0):
+        return str(job_hash), version, tuple(sorted(units_dict.items()))
+
+    def get(self, job_hash, units_dict, version=0):
+        key = self.make_key(job_hash, units_dict, version)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, job_hash, units_dict, body: bytes, version=0):
+        if len(body) > self.max_bytes:
+            return
+        key = self.make_key(job_hash, units_dict, version)
+        with self._lock:
+            if key in self._entries:
+                self._n_bytes -= len(self._entries.pop(key))
+            self._entries[key] = body
+            self._keys_by_job[key[0]].add(key)
+            self._n_bytes += len(body)
+            while len(self._entries) > self.max_entries or self._n_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        self._n_bytes -= len(self._entries.pop(key))
+        job_keys = self._keys_by_job[key[0]]
+        job_keys.discard(key)
+        if not job_keys:
+            del self._keys_by_job[key[0]]
+
+    def invalidate(self, job_hash):
+        with self._lock:
+            for key in list(self._keys_by_job.get(str(job_hash), [])):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_job.clear()
+            self._n_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+RESPONSE_CACHE = ResponseCache(
+    max_entries=conf.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=conf.RESPONSE_CACHE_MAX_SIZE
+)
+
+
+WIDGETS_CACHE = get_endpoint_cache('widgets')
+
+
+def _shared_version_key(job_hash):
+    return WIDGETS_CACHE.make_key('version', job_hash)
+
+
+def _job_version(job_hash):
+    """
+    The job's version, bumped by invalidate_job in whichever process writes its JobLog row. Only shared between
+    processes when the cache backend is (file or redis, see settings.CACHES)
+    """
+    if not WIDGETS_CACHE.enabled:
+        return 0
+    return WIDGETS_CACHE.backend.get(_shared_version_key(job_hash), 0)
+
+
+def _shared_key(job_hash, units_dict, version):
+    return WIDGETS_CACHE.make_key(job_hash, version, RESPONSE_CACHE.make_key(job_hash, units_dict))
+
+
+def get_cached_body(job_hash, units_dict):
+    """Look for a serialised response in this process's LRU, then in the cache shared between workers"""
+    version = _job_version(job_hash)
+    body = RESPONSE_CACHE.get(job_hash, units_dict, version)
+    if body is None and WIDGETS_CACHE.enabled:
+        body = WIDGETS_CACHE.get(_shared_key(job_hash, units_dict, version))
+        if body is not None:
+            RESPONSE_CACHE.set(job_hash, units_dict, body, version)
+    return body
+
+
+def is_final(body: bytes):
+    match = JOB_STATUS.search(body)
+    return match is not None and match[1] == b'SUCCESS'
+
+
+def set_cached_body(job_hash, units_dict, body: bytes):
+    # Failures and unfinished jobs can change, so only successful results are cached
+    if not is_final(body):
+        return
+    version = _job_version(job_hash)
+    RESPONSE_CACHE.set(job_hash, units_dict, body, version)
+    if WIDGETS_CACHE.enabled:
+        WIDGETS_CACHE.set(_shared_key(job_hash, units_dict, version), body)
+
+
+def invalidate_job(job_hash):
+    RESPONSE_CACHE.invalidate(job_hash)
+    if WIDGETS_CACHE.enabled:
+        shared_incr(WIDGETS_CACHE.backend, _shared_version_key(job_hash))
+
+
+def render_response(schema) -> bytes:
+    # Serialise a response schema the same way django-ninja's JSON renderer would
+    if isinstance(schema, HttpResponse):
+        return schema.content
+    return json.dumps(schema.dict(), cls=NinjaJSONEncoder).encode('utf-8')
+
+
+def json_response(body: bytes):
+    return HttpResponse(body, content_type=JSON_CONTENT_TYPE)
+
+
+def native_job_hash(request_schema):
+    """The job hash of a request once its units are set to CLIMADA's native units, as they are in the JobLog"""
+    return request_schema.copy(update=units.get_native_unit_parameters(request_schema)).get_id()
+
+
+def conversion_variant(units_dict):
+    """
+    The part of a cache key that describes a conversion to units_dict. Currency conversions also depend on the rate
+    table, so their bodies are keyed by its date and aren't served once the rates are refreshed
+    """
+    if units_dict.get('currency', units.NATIVE_UNITS_CLIMADA['currency']) != units.NATIVE_UNITS_CLIMADA['currency']:
+        return dict(units_dict, rates=str(currency.RATES.get_table().date))
+    return units_dict
+
+
+def _response_variant(args, units_dict):
+    # Responses differ by requested units and, when the endpoint takes one, the fields parameter in args[2]
+    from calc_api.job_management.fields import fields_key
+    fields = fields_key(args[2]) if len(args) > 2 else None
+    return dict(units_dict, fields=fields) if fields else units_dict
+
+
+@decorator
+def cache_response(func, *args, **kwargs):
+    """
+    Serves a widget submission from the response cache. Wrap this around wrangle_endpoint_units and pass it a
+    request that's already been standardised: the key is the job hash of the request in CLIMADA's native units plus
+    the units the user asked for, so a hit skips the database, the schema construction and the unit conversion.
+    Misses in this process fall back to the shared 'widgets' cache before doing the work.
+    """
+    # args[1] is the (standardised) request schema from the user
+    variant = _response_variant(args, conversion_variant(units.get_request_unittype_to_unitname_mapping(args[1])))
+    job_hash = native_job_hash(args[1])
+
+    body = get_cached_body(job_hash, variant)
+    if body is None:
+        body = render_response(func(*args, **kwargs))
+        set_cached_body(job_hash, variant, body)
+    return json_response(body)
+
+
+@decorator
+def cache_poll_response(func, *args, **kwargs):
+    """
+    Serves a widget result requested by job ID from the response cache. Polled results aren't unit-converted, and
+    only successful results are cached.
+    """
+    # args[1] is the job ID
+    job_hash = args[1]
+    variant = _response_variant(args, {})
+    body = get_cached_body(job_hash, variant)
+    if body is None:
+        body = render_response(func(*args, **kwargs))
+        set_cached_body(job_hash, variant, body)
+    return json_response(body)
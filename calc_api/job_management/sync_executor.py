@@ -0,0 +1,51 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from calc_api.config import ClimadaCalcApiConfig
+from climada_calc.settings import ASGI_THREADS
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+# Each thread holds at most one database connection, so this also bounds the connections an async worker opens.
+# A wsgi worker serves server: threads requests at a time, but a single request still runs several blocking calls at
+# once (e.g. a batch), so it gets at least MIN_SYNC_THREADS
+MIN_SYNC_THREADS = 4
+SYNC_THREADS = ASGI_THREADS if conf.SERVER_MODE == 'asgi' else max(MIN_SYNC_THREADS, conf.SERVER_THREADS)
+SYNC_EXECUTOR = ThreadPoolExecutor(max_workers=SYNC_THREADS, thread_name_prefix='calc-api-sync')
+
+# A new token for each request, so pool threads can tell when they start work for another request
+_REQUEST = contextvars.ContextVar('calc_api_request', default=None)
+_thread = threading.local()
+
+
+@receiver(request_started)
+def _start_request(sender, **kwargs):
+    _REQUEST.set(object())
+
+
+def _in_request(request, func, *args, **kwargs):
+    # Pool threads outlive requests, so tidy up their connections the way Django's request cycle would: once for each
+    # request, not for each call
+    if getattr(_thread, 'request', None) is not request:
+        _thread.request = request
+        close_old_connections()
+    return func(*args, **kwargs)
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking code (ORM queries, cache lookups, CPU-bound conversions) from an async view"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        SYNC_EXECUTOR,
+        functools.partial(_in_request, _REQUEST.get(), func, *args, **kwargs)
+    )
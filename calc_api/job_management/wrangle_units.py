@@ -10,13 +10,10 @@ def wrangle_endpoint_units(func, *args, **kwargs):
     same request is made with different units, the cache values that are retrieved are the same.
     """
     # args[1] is the request schema from the user
-    unit_parameters = units.get_request_unit_parameters(args[1])
     requested_units = units.get_request_unittype_to_unitname_mapping(args[1])
-    parameter_to_unittype = units.get_request_parameter_to_unittype_mapping(args[1])
 
-    for param in unit_parameters:
-        unit_type = parameter_to_unittype[param]
-        args[1].__setattr__(param, units.NATIVE_UNITS_CLIMADA[unit_type])
+    for param, native_unit in units.get_native_unit_parameters(args[1]).items():
+        args[1].__setattr__(param, native_unit)
 
     # Run the calculation (or get cached result from database)
     result = func(*args, **kwargs)
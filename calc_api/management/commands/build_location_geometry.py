@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.vizz.models import Location, LocationPolygon
+from calc_api.calc_methods.location_geometry import build_all
+
+conf = ClimadaCalcApiConfig()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the binary geometry, bounds and simplified polygons of every Location from its WKT. Run this ' \
+           'after loading locations with bulk operations, which skip the signals that keep them up to date, or ' \
+           'after changing the location-geometry resolutions'
+
+    def handle(self, *args, **options):
+        if conf.DATABASE_MODE not in ['create', 'update']:
+            raise CommandError(f'Not writing to Location: database mode is {conf.DATABASE_MODE}')
+        n_built = build_all(Location, LocationPolygon)
+        self.stdout.write(f'Built geometry for {n_built} locations')
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calc_api import util
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.vizz.models import JobLog
+from calc_api.vizz.schemas import PlaceSchema
+from calc_api.vizz import schemas_widgets  # noqa: F401 (defines the widget request schemas)
+from calc_api.job_management.request_key import CLASS_KEY, request_key
+
+conf = ClimadaCalcApiConfig()
+
+
+def request_schemas():
+    """Every request schema by class name, as written in the __class__ key of an encoded request"""
+    schemas, pending = {}, [PlaceSchema]
+    while pending:
+        cls = pending.pop()
+        schemas[cls.__name__] = cls
+        pending.extend(cls.__subclasses__())
+    return schemas
+
+
+def find_request(thing, schemas):
+    """The first encoded request schema in a decoded JobLog args value, as a dict, or None"""
+    if isinstance(thing, dict):
+        if thing.get(CLASS_KEY) in schemas:
+            return thing
+        thing = list(thing.values())
+    if isinstance(thing, list):
+        for item in thing:
+            found = find_request(item, schemas)
+            if found is not None:
+                return found
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Check that job hashes computed by request_key match the job_hash of stored JobLog rows. The requests ' \
+           'are rebuilt from the encoded request schemas in each row\'s args'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--func', help='Only check JobLog rows created by this function')
+        parser.add_argument('--limit', type=int, help='Check at most this many rows')
+        parser.add_argument('--show', type=int, default=10, help='Number of mismatches to list')
+
+    def handle(self, *args, **options):
+        schemas = request_schemas()
+        jobs = JobLog.objects.order_by('job_hash')
+        if options['func']:
+            jobs = jobs.filter(func=options['func'])
+        if options['limit']:
+            jobs = jobs[:options['limit']]
+
+        n_match, n_skipped, mismatches = 0, 0, []
+        for job_hash, args in jobs.values_list('job_hash', 'args').iterator(chunk_size=conf.CHUNK_SIZE):
+            try:
+                encoded = find_request(json.loads(args), schemas)
+            except ValueError:
+                encoded = None
+            if encoded is None:
+                n_skipped += 1
+                continue
+            request = schemas[encoded[CLASS_KEY]].parse_obj(encoded)
+            key, legacy_key = str(request_key(request)), str(util.get_hash(request))
+            if key == job_hash and legacy_key == job_hash:
+                n_match += 1
+            else:
+                mismatches.append((job_hash, key, legacy_key))
+
+        for job_hash, key, legacy_key in mismatches[:options['show']]:
+            self.stderr.write(f'{job_hash}: request_key gives {key}, util.get_hash gives {legacy_key}')
+        self.stdout.write(f'{n_match} job hashes match, {len(mismatches)} don\'t. '
+                          f'Skipped {n_skipped} rows without an encoded request in their args')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} job hashes don\'t match their requests')
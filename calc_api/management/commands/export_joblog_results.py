@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from calc_api.job_management.joblog_results import WIDGET_JOB_SCHEMAS
+from calc_api.job_management.export import export_queryset, ndjson_lines
+
+
+class Command(BaseCommand):
+    help = 'Export JobLog results as NDJSON, one row per line, without loading the table into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write to. Defaults to stdout')
+        parser.add_argument('--func', help='Only export JobLog rows created by this function')
+        parser.add_argument('--widget', choices=list(WIDGET_JOB_SCHEMAS),
+                            help="Only export results validated as this widget's response")
+        parser.add_argument('--hazard-type', action='append', dest='hazard_types',
+                            help='Only export jobs for this hazard type. Can be repeated')
+        parser.add_argument('--location-code', action='append', dest='location_codes',
+                            help='Only export jobs for this location code. Can be repeated')
+
+    def handle(self, *args, **options):
+        jobs = export_queryset(options['func'], options['widget'], options['hazard_types'], options['location_codes'])
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        n_rows = 0
+        try:
+            for line in ndjson_lines(jobs):
+                out.write(line)
+                n_rows += 1
+        finally:
+            if options['output']:
+                out.close()
+        self.stderr.write(f'Exported {n_rows} JobLog rows')
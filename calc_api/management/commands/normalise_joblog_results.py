@@ -0,0 +1,61 @@
+import json
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.vizz.models import JobLog
+
+conf = ClimadaCalcApiConfig()
+
+
+class Command(BaseCommand):
+    help = 'Rewrite JobLog results stored as JSON strings as native JSON objects, in batches. Safe to interrupt ' \
+           'and rerun: it picks up the rows that are still strings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--start-after', default=None,
+                            help='Skip rows with job hashes up to and including this one')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def string_results(self):
+        jobs = JobLog.objects.filter(result__isnull=False)
+        if connection.vendor == 'postgresql':
+            # Uses the calc_api_joblog_result_type index
+            jobs = jobs.extra(where=["jsonb_typeof(result) = 'string'"])
+        return jobs.order_by('job_hash')
+
+    def handle(self, *args, **options):
+        if conf.DATABASE_MODE not in ['create', 'update'] and not options['dry_run']:
+            raise CommandError(f'Not writing to JobLog: database mode is {conf.DATABASE_MODE}')
+
+        last_hash = options['start_after']
+        n_converted, n_failed = 0, 0
+        while True:
+            jobs = self.string_results()
+            if last_hash:
+                jobs = jobs.filter(job_hash__gt=last_hash)
+            batch = list(jobs.only('job_hash', 'result')[:options['batch_size']])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                for job in batch:
+                    if not isinstance(job.result, str):
+                        continue
+                    try:
+                        result = json.loads(job.result)
+                    except ValueError as e:
+                        n_failed += 1
+                        self.stderr.write(f'{job.job_hash}: result is not valid JSON. {e}')
+                        continue
+                    if not options['dry_run']:
+                        # update() rather than save(): the content is unchanged so signal receivers needn't run
+                        JobLog.objects.filter(job_hash=job.job_hash).update(result=result)
+                    n_converted += 1
+
+            last_hash = batch[-1].job_hash
+            self.stdout.write(f'Converted {n_converted} results so far. Resume with --start-after {last_hash}')
+
+        self.stdout.write(f'Done. Converted {n_converted} results, {n_failed} could not be read')
@@ -0,0 +1,56 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calc_api.config import ClimadaCalcApiConfig
+
+conf = ClimadaCalcApiConfig()
+
+# python -X importtime writes lines like 'import time:       646 |      66096 |     django.db.models.aggregates'
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent>\s*)(?P<module>\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Report what importing the API costs, module by module, in a fresh interpreter with python -X importtime. ' \
+           'Fails if the total is over the startup: import-budget in the config'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', default=['calc_api.vizz.ninja', 'climada_calc.urls'],
+                            help='Modules to import after django.setup()')
+        parser.add_argument('--top', type=int, default=20, help='Number of modules to list')
+        parser.add_argument('--sort', choices=['self', 'cumulative'], default='self')
+        parser.add_argument('--budget', type=int, default=conf.IMPORT_BUDGET,
+                            help='Milliseconds. Defaults to startup: import-budget in the config')
+
+    def handle(self, *args, **options):
+        code = 'import django; django.setup(); ' + '; '.join(f'import {module}' for module in options['modules'])
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            env=dict(os.environ), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Import failed:\n{result.stderr[-2000:]}')
+
+        timings = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                timings.append((match['module'], int(match['self']), int(match['cumulative']), len(match['indent'])))
+        if not timings:
+            raise CommandError('No import timings in the output. Is this interpreter CPython 3.7 or later?')
+
+        # Top-level imports are the least indented. Their cumulative times add up to the total
+        top_indent = min(indent for _, _, _, indent in timings)
+        total_ms = sum(cumulative for _, _, cumulative, indent in timings if indent == top_indent) / 1000
+
+        column = 1 if options['sort'] == 'self' else 2
+        self.stdout.write(f'{"self ms":>9} {"cumul. ms":>10}  module')
+        for timing in sorted(timings, key=lambda t: -t[column])[:options['top']]:
+            self.stdout.write(f'{timing[1] / 1000:9.1f} {timing[2] / 1000:10.1f}  {timing[0]}')
+        self.stdout.write(f'Total import time {total_ms:.0f} ms for {len(timings)} modules. '
+                          f'Budget {options["budget"]} ms')
+        if total_ms > options['budget']:
+            raise CommandError(f'Importing the API took {total_ms:.0f} ms, over the {options["budget"]} ms budget')
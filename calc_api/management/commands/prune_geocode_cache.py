@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from calc_api.calc_methods.geocode_cache import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired rows from the persistent geocoding cache'
+
+    def handle(self, *args, **options):
+        n_deleted = prune_expired()
+        self.stdout.write(f'Deleted {n_deleted} expired geocoding results')
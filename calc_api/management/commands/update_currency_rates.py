@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from calc_api.vizz import currency
+
+
+class Command(BaseCommand):
+    help = "Fetch today's currency rate table and store it in the database, where requests read it. Run daily: " \
+           "requests never fetch rates themselves"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='forex', choices=['forex', 'file', 'database'],
+                            help='Provider to read the rate table from')
+        parser.add_argument('--to', nargs='+', default=['database'], choices=['database'],
+                            help='Providers to write the rate table to')
+
+    def handle(self, *args, **options):
+        try:
+            table = currency.make_provider(options['source']).load_table()
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        for name in options['to']:
+            if name == options['source']:
+                continue
+            currency.make_provider(name).save_table(table)
+            self.stdout.write(f'Saved {len(table.rates)} {table.base} rates for {table.date} with the {name} provider')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.vizz.models import JobLog
+from calc_api.job_management.joblog_results import WIDGET_JOB_SCHEMAS, store_validated_result
+
+conf = ClimadaCalcApiConfig()
+
+
+class Command(BaseCommand):
+    help = 'Validate stored JobLog results so they can be served without re-validation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('widget', choices=list(WIDGET_JOB_SCHEMAS),
+                            help='Widget whose response schema the results should match')
+        parser.add_argument('--func', help='Only validate JobLog rows created by this function')
+        parser.add_argument('--all', action='store_true',
+                            help='Revalidate rows that have already been validated')
+
+    def handle(self, *args, **options):
+        if conf.DATABASE_MODE not in ['create', 'update']:
+            raise CommandError(f'Not writing to JobLog: database mode is {conf.DATABASE_MODE}')
+
+        job_schema = WIDGET_JOB_SCHEMAS[options['widget']]
+        jobs = JobLog.objects.filter(result__isnull=False)
+        if options['func']:
+            jobs = jobs.filter(func=options['func'])
+        if not options['all']:
+            jobs = jobs.filter(result_json__isnull=True)
+
+        n_valid, n_invalid = 0, 0
+        for job in jobs.iterator(chunk_size=conf.CHUNK_SIZE):
+            try:
+                store_validated_result(job, job_schema)
+            except ValueError as e:
+                n_invalid += 1
+                self.stderr.write(f'{job.job_hash}: not a valid {options["widget"]} result. {e}')
+                continue
+            n_valid += 1
+        self.stdout.write(f'Validated {n_valid} results. {n_invalid} did not match the schema')
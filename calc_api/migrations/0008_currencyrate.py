@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc_api', '0007_alter_location_admin1_id_alter_location_admin2_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('base', models.CharField(max_length=3)),
+                ('currency', models.CharField(max_length=3)),
+                ('rate', models.FloatField()),
+            ],
+            options={
+                'unique_together': {('date', 'base', 'currency')},
+            },
+        ),
+    ]
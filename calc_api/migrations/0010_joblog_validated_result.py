@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc_api', '0009_geocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='joblog',
+            name='result_schema',
+            field=models.CharField(max_length=60, null=True),
+        ),
+        migrations.AddField(
+            model_name='joblog',
+            name='result_json',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='joblog',
+            name='result_uri',
+            field=models.TextField(null=True),
+        ),
+    ]
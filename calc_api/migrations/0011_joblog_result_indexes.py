@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# JobLog.result is jsonb on Postgres. These only help once results are stored as objects rather than JSON strings:
+# see the normalise_joblog_results command.
+INDEXES = [
+    ('calc_api_joblog_result_gin', 'USING gin (result jsonb_path_ops)'),
+    ('calc_api_joblog_result_uri', "((result -> 'metadata' ->> 'uri'))"),
+    ('calc_api_joblog_result_type', "(jsonb_typeof(result))"),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, definition in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON calc_api_joblog {definition}')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc_api', '0010_joblog_validated_result'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
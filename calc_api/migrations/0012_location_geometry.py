@@ -0,0 +1,82 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from shapely import wkt
+
+# The location-geometry resolutions when this migration was written. After changing them in the config, run
+# manage.py build_location_geometry
+RESOLUTIONS = {'medium': 0.01, 'low': 0.1}
+
+
+def build_geometry(apps, schema_editor):
+    Location = apps.get_model('calc_api', 'Location')
+    LocationPolygon = apps.get_model('calc_api', 'LocationPolygon')
+    for loc in Location.objects.all().iterator(chunk_size=1000):
+        bbox = wkt.loads(loc.bbox) if loc.bbox else None
+        poly = wkt.loads(loc.poly) if loc.poly else None
+        bounds = bbox.bounds if bbox else [None] * 4
+        Location.objects.filter(pk=loc.pk).update(
+            bbox_wkb=bbox.wkb if bbox else None,
+            poly_wkb=poly.wkb if poly else None,
+            **dict(zip(['min_lon', 'min_lat', 'max_lon', 'max_lat'], bounds))
+        )
+        poly = poly or bbox
+        if poly is not None:
+            LocationPolygon.objects.bulk_create([
+                LocationPolygon(location_id=loc.pk, resolution=name,
+                                wkb=poly.simplify(tolerance, preserve_topology=True).wkb)
+                for name, tolerance in RESOLUTIONS.items()
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc_api', '0011_joblog_result_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='bbox_wkb',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='poly_wkb',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='min_lon',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='min_lat',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='max_lon',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='max_lat',
+            field=models.FloatField(null=True),
+        ),
+        migrations.CreateModel(
+            name='LocationPolygon',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(max_length=20)),
+                ('wkb', models.BinaryField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='polygons',
+                                               to='calc_api.location')),
+            ],
+            options={
+                'unique_together': {('location', 'resolution')},
+            },
+        ),
+        migrations.RunPython(build_geometry, migrations.RunPython.noop),
+    ]
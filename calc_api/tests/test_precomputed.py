@@ -0,0 +1,37 @@
+"""
+The extreme-heat widgets are served from precomputed payloads. The expected bodies' MD5s were taken from the
+responses of the hard-coded payloads the store replaced.
+"""
+import hashlib
+
+import pytest
+
+from calc_api.job_management.precomputed import precomputed_body
+from calc_api.tests.test_request_key import GEOCODING, PLACE
+from calc_api.vizz import schemas_widgets
+from calc_api.vizz.schemas_geocoding import GeocodePlace
+
+
+def timeline_request(temperature):
+    return schemas_widgets.TimelineWidgetRequest(
+        **PLACE, geocoding=GeocodePlace(**GEOCODING), hazard_type='extreme_heat', hazard_rp='100',
+        impact_type='people_affected', scenario_name='ssp245', scenario_year=2040, units_hazard=temperature,
+        units_exposure='people', units_warming=temperature)
+
+
+def costbenefit_request(temperature):
+    return schemas_widgets.CostBenefitWidgetRequest(
+        **PLACE, geocoding=GeocodePlace(**GEOCODING), hazard_type='extreme_heat', impact_type='people_affected',
+        scenario_name='ssp245', scenario_year=2040, measure_ids=[1], units_hazard=temperature,
+        units_exposure='people', units_currency='USD', units_warming=temperature)
+
+
+@pytest.mark.parametrize('widget, make_request, temperature, body_md5', [
+    ('risk-timeline', timeline_request, 'degC', 'efb3d6e1124c6129c1753c350b56a738'),
+    ('risk-timeline', timeline_request, 'degF', 'efb3d6e1124c6129c1753c350b56a738'),
+    ('cost-benefit', costbenefit_request, 'degC', '7316566172f14c49f4c636e8ccdd21a4'),
+    ('cost-benefit', costbenefit_request, 'degF', '4fef996b75222cb1852306213e3a92d0'),
+])
+def test_extreme_heat_bodies_unchanged(widget, make_request, temperature, body_md5):
+    body = precomputed_body(widget, make_request(temperature))
+    assert hashlib.md5(body).hexdigest() == body_md5
@@ -0,0 +1,82 @@
+"""
+Job hashes key the JobLog table, so they must not change. The expected values were computed with util.get_hash
+before request_key replaced it.
+"""
+import pytest
+
+from calc_api import util
+from calc_api.job_management.request_key import request_key
+from calc_api.vizz import schemas_widgets
+from calc_api.vizz.schemas_geocoding import GeocodePlace
+
+GEOCODING = dict(
+    name='Havana, Cuba', id='havana', scale='city', country='Cuba', country_id='CUB',
+    bbox=[-82.5, 22.9, -82.2, 23.2],
+    poly=[[-82.5, 22.9], [-82.5, 23.2], [-82.2, 23.2], [-82.2, 22.9], [-82.5, 22.9]]
+)
+PLACE = dict(
+    location_name='Havana, Cuba', location_scale='city', location_code='havana',
+    location_poly='POLYGON ((-82.5 22.9, -82.5 23.2, -82.2 23.2, -82.2 22.9, -82.5 22.9))'
+)
+
+
+def timeline_request():
+    return schemas_widgets.TimelineWidgetRequest(
+        **PLACE, geocoding=GeocodePlace(**GEOCODING), hazard_type='tropical_cyclone', hazard_rp='100',
+        impact_type='people_affected', scenario_name='ssp245', scenario_year=2040, units_hazard='m/s',
+        units_exposure='people', units_warming='degC')
+
+
+def costbenefit_request():
+    return schemas_widgets.CostBenefitWidgetRequest(
+        **PLACE, geocoding=GeocodePlace(**GEOCODING), hazard_type='tropical_cyclone', impact_type='economic_impact',
+        scenario_name='ssp245', scenario_year=2080, measure_ids=[1, 2], units_currency='USD', units_hazard='m/s',
+        units_warming='degC')
+
+
+def biodiversity_request():
+    return schemas_widgets.BiodiversityWidgetRequest(
+        **PLACE, geocoding=GeocodePlace(**GEOCODING), hazard_type='tropical_cyclone')
+
+
+@pytest.mark.parametrize('make_request, job_hash', [
+    (timeline_request, '0f67e192-8308-ac1c-6246-95f195f6155f'),
+    (costbenefit_request, '69a37e80-2761-8ded-157d-8ce71a116cfa'),
+    (biodiversity_request, 'd1c32797-6342-6559-f707-9ae6ba0a37c5'),
+])
+def test_job_hash_unchanged(make_request, job_hash):
+    request = make_request()
+    assert str(request_key(request)) == job_hash
+    assert str(request.get_id()) == job_hash
+    assert str(util.get_hash(request)) == job_hash
+
+
+def test_request_unchanged_by_hashing():
+    request = costbenefit_request()
+    before = request.dict()
+    request.get_id()
+    assert request.dict() == before
+    assert '__class__' not in request.__dict__
+
+
+def test_hash_follows_reassigned_fields():
+    request = costbenefit_request()
+    request.get_id()
+    request.measure_ids = [1, 2, 3]
+    assert str(request.get_id()) == '0fea4fa9-1178-7c81-d1cc-813bd9942900'
+
+
+def test_hash_follows_fields_changed_in_place():
+    request = costbenefit_request()
+    request.get_id()
+    request.measure_ids.append(3)
+    assert str(request.get_id()) == '0fea4fa9-1178-7c81-d1cc-813bd9942900'
+
+
+def test_hash_follows_geocoding_changed_in_place():
+    request = timeline_request()
+    request.get_id()
+    request.geocoding.bbox[0] = -82.6
+    request.geocoding.poly.append([-82.5, 22.9])
+    assert str(request.get_id()) == '5f2530d6-c332-1918-6c68-9e306e1407fe'
+    assert str(request.get_id()) == str(util.get_hash(request))
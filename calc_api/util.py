@@ -3,6 +3,10 @@ import json
 import datetime
 from uuid import UUID
 
+class RequestValidationError(ValueError):
+    """A problem with the parameters of a request. The API answers it with a 400"""
+
+
 HASH_FUNCS = {
     'md5': hashlib.md5,
     'sha1': hashlib.sha1
@@ -39,9 +43,8 @@ def json_default(thing):
     # except TypeError:
     #     pass
     try:
-        thing_dict = thing.__dict__
-        thing_dict['__class__'] = type(thing).__name__
-        return thing_dict
+        # A copy: adding __class__ to the object's own __dict__ would leak into its .dict() and later hashes
+        return dict(thing.__dict__, __class__=type(thing).__name__)
     except TypeError:
         pass
     if isinstance(thing, datetime.datetime):
@@ -49,23 +52,28 @@ def json_default(thing):
     raise TypeError(f"object of type {type(thing).__name__} not serializable with the calc_api utils")
 
 
+ENCODE_OPTIONS = dict(
+    default=json_default,
+    ensure_ascii=False,
+    sort_keys=True,
+    indent=None,
+    separators=(',', ':'),
+)
+
+
 def encode(thing):
-    return json.dumps(
-        thing,
-        default=json_default,
-        ensure_ascii=False,
-        sort_keys=True,
-        indent=None,
-        separators=(',', ':'),
-    )
+    return json.dumps(thing, **ENCODE_OPTIONS)
 
 
-def get_hash(thing):
-    dump = encode(thing)
+def hash_dump(dump):
     hexcode = hashlib.md5(dump.encode('utf-8')).hexdigest()
     return UUID(hex=hexcode)
 
 
+def get_hash(thing):
+    return hash_dump(encode(thing))
+
+
 def get_args_dict(name, *args, **kwargs):
     args_dict = {str(i): a for i, a in enumerate(args)}
     args_dict.update({'name': name})
@@ -0,0 +1,220 @@
+import abc
+import datetime
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Mapping
+
+from calc_api.config import ClimadaCalcApiConfig
+from climada_calc.settings import BASE_DIR
+
+conf = ClimadaCalcApiConfig()
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+
+@dataclass(frozen=True)
+class RateTable:
+    """Exchange rates on one day, as units of each currency per unit of the base currency"""
+    base: str
+    date: datetime.date
+    rates: Mapping[str, float]
+
+    def get_rate(self, currency_from, currency_to):
+        if currency_from == currency_to:
+            return 1.0
+        try:
+            rate_from = 1.0 if currency_from == self.base else self.rates[currency_from]
+            rate_to = 1.0 if currency_to == self.base else self.rates[currency_to]
+        except KeyError as e:
+            raise LookupError(f'No exchange rate available for {e.args[0]} in the {self.date} rate table') from None
+        return rate_to / rate_from
+
+    def is_older_than(self, seconds):
+        return datetime.date.today() - self.date > datetime.timedelta(seconds=seconds)
+
+    def to_dict(self):
+        return {'base': self.base, 'date': self.date.isoformat(), 'rates': dict(self.rates)}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            base=d['base'],
+            date=datetime.date.fromisoformat(d['date']),
+            rates={currency: float(rate) for currency, rate in d['rates'].items()}
+        )
+
+
+class RateProvider(abc.ABC):
+    """A source of exchange rate tables. Providers raise LookupError when they have nothing to give."""
+    name = None
+
+    @abc.abstractmethod
+    def load_table(self) -> RateTable:
+        pass
+
+
+class FileRateProvider(RateProvider):
+    """Reads a rate table from a JSON file: {"base": "USD", "date": "2023-01-31", "rates": {"EUR": 0.92}}"""
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load_table(self):
+        if not self.path.exists():
+            raise LookupError(f'No currency rate file at {self.path}')
+        try:
+            with open(self.path) as f:
+                return RateTable.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            raise LookupError(f'Could not read the currency rate file {self.path}: {e}') from e
+
+    def save_table(self, table: RateTable):
+        with open(self.path, 'w') as f:
+            json.dump(table.to_dict(), f, indent=2)
+
+
+class DatabaseRateProvider(RateProvider):
+    """Reads the most recent day of rates from the CurrencyRate table"""
+    name = 'database'
+
+    def load_table(self):
+        from django.db import DatabaseError
+        from calc_api.vizz.models import CurrencyRate
+        try:
+            latest = CurrencyRate.objects.order_by('-date').first()
+            rows = list(CurrencyRate.objects.filter(date=latest.date, base=latest.base)) if latest else None
+        except DatabaseError as e:
+            raise LookupError(f'Could not read currency rates from the database: {e}') from e
+        if not latest:
+            raise LookupError('No currency rates in the database')
+        return RateTable(
+            base=latest.base,
+            date=latest.date,
+            rates={row.currency: row.rate for row in rows}
+        )
+
+    def save_table(self, table: RateTable):
+        from calc_api.vizz.models import CurrencyRate
+        for currency, rate in table.rates.items():
+            CurrencyRate.objects.update_or_create(
+                date=table.date, base=table.base, currency=currency, defaults={'rate': rate}
+            )
+
+
+class ForexRateProvider(RateProvider):
+    """Fetches today's table with forex_python. Used by the update_currency_rates command, never by requests"""
+    name = 'forex'
+
+    def __init__(self, base='USD'):
+        self.base = base
+
+    def load_table(self):
+        from forex_python.converter import CurrencyRates, RatesNotAvailableError
+        try:
+            rates = CurrencyRates().get_rates(self.base)
+        except (RatesNotAvailableError, OSError, ValueError) as e:
+            raise LookupError(f'Could not fetch currency rates from forex_python: {e}') from e
+        return RateTable(base=self.base, date=datetime.date.today(), rates=rates)
+
+
+class CachedRateService:
+    """
+    Serves exchange rates from an in-memory table. The table is reloaded from the providers, in order, once it's
+    older than the TTL. Only local providers (file and database) are read here, so a conversion never waits on the
+    network: the update_currency_rates command fetches new rates into the database. A provider whose table is dated
+    more than the TTL ago is passed over for the next one. If no provider has a current table we use the most recent
+    stale one, and if every provider fails we keep serving the last table we had.
+    """
+
+    def __init__(self, providers: List[RateProvider], ttl, retry_interval=300):
+        self.providers = providers
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._table = None
+        self._refresh_after = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        failures, stale = [], None
+        for provider in self.providers:
+            try:
+                table = provider.load_table()
+            except LookupError as e:
+                failures.append(f'{provider.name}: {e}')
+                continue
+            if table.is_older_than(self.ttl):
+                failures.append(f'{provider.name}: rates are from {table.date}.')
+                if stale is None or table.date > stale.date:
+                    stale = table
+                continue
+            LOGGER.debug(f'Loaded {table.date} currency rates from the {provider.name} provider')
+            return table
+        if stale is not None:
+            LOGGER.warning(f'No current currency rates, using rates from {stale.date}. ' + ' '.join(failures))
+            return stale
+        raise LookupError('No currency rate provider could supply rates. ' + ' '.join(failures))
+
+    def get_table(self) -> RateTable:
+        if self._table is not None and time.monotonic() < self._refresh_after:
+            return self._table
+        with self._lock:
+            if self._table is not None and time.monotonic() < self._refresh_after:
+                return self._table
+            try:
+                self._table = self._fetch()
+                # Keep asking for current rates if all we could get was an old table
+                stale = self._table.is_older_than(self.ttl)
+                self._refresh_after = time.monotonic() + (self.retry_interval if stale else self.ttl)
+            except LookupError as e:
+                if self._table is None:
+                    raise
+                LOGGER.warning(f'Using stale currency rates from {self._table.date}. {e}')
+                self._refresh_after = time.monotonic() + self.retry_interval
+        return self._table
+
+    def get_rate(self, currency_from, currency_to):
+        if currency_from == currency_to:
+            return 1.0
+        return self.get_table().get_rate(currency_from, currency_to)
+
+    def clear(self):
+        with self._lock:
+            self._table = None
+            self._refresh_after = 0
+
+
+def make_provider(name):
+    if name == 'file':
+        return FileRateProvider(Path(BASE_DIR, conf.CURRENCY_RATES_FILE))
+    if name == 'database':
+        return DatabaseRateProvider()
+    if name == 'forex':
+        return ForexRateProvider()
+    raise ValueError(f'Unknown currency rate provider: {name}. Possible values: file, database, forex')
+
+
+LOCAL_PROVIDERS = ['database', 'file']
+
+
+def make_local_provider(name):
+    """A provider that requests can read from: one that doesn't call out to the network"""
+    if name not in LOCAL_PROVIDERS:
+        raise ValueError(f'Requests only read currency rates from {", ".join(LOCAL_PROVIDERS)}. Received {name}. '
+                         f'Fetch rates from the network with manage.py update_currency_rates')
+    return make_provider(name)
+
+
+RATES = CachedRateService(
+    providers=[make_local_provider(name) for name in conf.CURRENCY_PROVIDERS],
+    ttl=conf.CURRENCY_RATES_TTL
+)
+
+
+def get_rate(currency_from, currency_to):
+    return RATES.get_rate(currency_from, currency_to)
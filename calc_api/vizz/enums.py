@@ -1,8 +1,7 @@
 from enum import Enum
-from typing import List
-import numpy as np
+from typing import List, Mapping
 
-from calc_api.vizz.util import get_options
+from calc_api.vizz.util import get_options, OPTIONS
 
 
 # TODO generate all these from the options
@@ -108,7 +107,7 @@ def get_option_choices(options_path: List[str], get_value: str = None, parameter
     options = get_options()
     for opt in options_path:
         options = options[opt]
-    if options.__class__ == dict and 'choices' in options.keys():
+    if isinstance(options, Mapping) and 'choices' in options.keys():
         options = options['choices']
     if parameters:
         for key, value in parameters.items():
@@ -121,36 +120,49 @@ def get_option_choices(options_path: List[str], get_value: str = None, parameter
     return options
 
 
+def _get_indexed_choices(choices: Mapping, get_value=None, parameters=None):
+    options = list(choices.values())
+    if parameters:
+        for key, value in parameters.items():
+            options = [opt for opt in options if opt[key] == value]
+    if get_value:
+        return [opt[get_value] for opt in options]
+    return options
+
+
 def get_hazard_type_names():
-    return get_option_choices(['data', 'filters'])
+    return list(OPTIONS.hazards.keys())
 
 
 def get_year_options(hazard_type, get_value=None, parameters=None):
-    return get_option_choices(['data', 'filters', hazard_type, 'scenario_options', 'year'], get_value, parameters)
+    return _get_indexed_choices(OPTIONS.hazard(hazard_type).years, get_value, parameters)
 
 
 def get_scenario_options(hazard_type, get_value=None, parameters=None):
-    return get_option_choices(['data', 'filters', hazard_type, 'scenario_options', 'climate_scenario'], get_value, parameters)
+    return _get_indexed_choices(OPTIONS.hazard(hazard_type).scenarios, get_value, parameters)
 
 
 def get_impact_options(hazard_type, get_value=None, parameters=None):
-    return get_option_choices(['data', 'filters', hazard_type, 'scenario_options', 'impact_type'], get_value, parameters)
+    if get_value == 'value' and not parameters:
+        return list(OPTIONS.hazard(hazard_type).impacts.keys())
+    return _get_indexed_choices(OPTIONS.hazard(hazard_type).impacts, get_value, parameters)
 
 
 def get_rp_options(hazard_type, get_value=None, parameters=None):
-    return get_option_choices(['data', 'filters', hazard_type, 'scenario_options', 'return_period'], get_value, parameters)
+    return _get_indexed_choices(OPTIONS.hazard(hazard_type).return_periods, get_value, parameters)
+
+
+def get_hazard_unit_type(hazard_type):
+    return OPTIONS.hazard(hazard_type).unit_type
 
 
 def get_unit_options(unit_type):
-    return get_option_choices(['data', 'units', unit_type], get_value='value')
+    return list(OPTIONS.unit_options(unit_type))
 
 
 def get_exposure_types(hazard_type=None):
     if hazard_type:
         impact_list = get_impact_options(hazard_type, get_value='value')
     else:
-        haz_names = get_hazard_type_names()
-        list_of_impact_lists = [get_impact_options(haz, get_value='value') for haz in haz_names]
-        impact_list = list(np.concatenate([np.array(impacts) for impacts in list_of_impact_lists]))
+        impact_list = [impact for haz in OPTIONS.hazards.values() for impact in haz.impacts.keys()]
     return list(set([exposure_type_from_impact_type(impact) for impact in impact_list]))
-
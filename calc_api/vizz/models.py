@@ -14,6 +14,10 @@ class JobLog(models.Model):
     args = models.TextField()
     kwargs = models.TextField()
     result = models.JSONField(null=True)
+    # Set by job_management.joblog_results.store_validated_result when the result is validated on write
+    result_schema = models.CharField(max_length=60, null=True)
+    result_json = models.TextField(null=True)
+    result_uri = models.TextField(null=True)
 
 
 class Cobenefit(models.Model):
@@ -60,6 +64,47 @@ class Location(models.Model):
     admin2_id = models.CharField(max_length=60, null=True)
     bbox = models.TextField(null=True)
     poly = models.TextField(null=True)
+    # Binary copies of bbox and poly, and the bbox's bounds, kept up to date by calc_methods.location_geometry
+    bbox_wkb = models.BinaryField(null=True)
+    poly_wkb = models.BinaryField(null=True)
+    min_lon = models.FloatField(null=True)
+    min_lat = models.FloatField(null=True)
+    max_lon = models.FloatField(null=True)
+    max_lat = models.FloatField(null=True)
+
+
+class LocationPolygon(models.Model):
+    """A Location's polygon simplified to one of the resolutions in the location-geometry config, as WKB"""
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='polygons')
+    resolution = models.CharField(max_length=20)
+    wkb = models.BinaryField()
+
+    class Meta:
+        unique_together = ['location', 'resolution']
+
+
+class GeocodeCache(models.Model):
+    provider = models.CharField(max_length=20)
+    lookup = models.CharField(max_length=20)
+    query = models.TextField()
+    language = models.CharField(max_length=10)
+    found = models.BooleanField(default=True)
+    result = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ['provider', 'lookup', 'query', 'language']
+
+
+class CurrencyRate(models.Model):
+    date = models.DateField(db_index=True)
+    base = models.CharField(max_length=3)
+    currency = models.CharField(max_length=3)
+    rate = models.FloatField()
+
+    class Meta:
+        unique_together = ['date', 'base', 'currency']
 
 
 class SSP_GDP(models.Model):
@@ -1,5 +1,6 @@
 from django.utils import timezone
 from ninja import Schema, ModelSchema
+from pydantic import PrivateAttr
 from typing import List
 import datetime
 import uuid
@@ -9,14 +10,16 @@ import logging
 import numpy as np
 
 from calc_api.config import ClimadaCalcApiConfig
+from calc_api.util import RequestValidationError
 from calc_api.vizz.models import JobLog, Measure
 from calc_api.vizz import enums
 from calc_api.calc_methods.util import standardise_scenario, bbox_to_wkt
-from calc_api.calc_methods.geocode import standardise_location
+from calc_api.calc_methods.geocode import standardise_location, astandardise_location
+from calc_api.job_management.sync_executor import run_sync
+from calc_api.job_management.request_key import request_key
 from calc_api.vizz import schemas_geocoding
-from calc_api.vizz.enums import get_option_choices, get_option_parameter, get_exposure_types, get_hazard_type_names
+from calc_api.vizz.enums import get_unit_options, get_exposure_types
 from calc_api.vizz import units
-from calc_api import util
 
 conf = ClimadaCalcApiConfig()
 
@@ -27,6 +30,16 @@ LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
 # TODO add 'standardise' methods to each of these classes (possibly as part of an __init__)
 
 
+def load_joblog_result(result):
+    """
+    A JobLog result as a dict. Older rows hold the result as a JSON string inside the JSON column (see the
+    normalise_joblog_results command), newer ones hold it natively.
+    """
+    result = json.loads(result) if isinstance(result, str) else dict(result)
+    result.pop('__class__', None)
+    return result
+
+
 # We don't actually use this: we create similar schema later with typed responses.
 class JobSchema(Schema):
     job_id: uuid.UUID
@@ -53,9 +66,7 @@ class JobSchema(Schema):
             raise ValueError('JobLog has no result')
 
         request = job.args
-        result = json.loads(job.result)
-        if '__class__' in result.keys():
-            _ = result.pop('__class__')
+        result = load_joblog_result(job.result)
         uri = result['metadata']['uri'] if 'uri' in result['metadata'] else None
         output = cls(
             job_id=job.job_hash,
@@ -221,9 +232,11 @@ class ColorbarLegend(ResponseSchema):
         scale_function = units.make_conversion_function(from_unit, to_unit)
         self.value = scale_function(self.value)
         self.units = to_unit
-        for legend in self.items:
-            legend.band_min = scale_function(legend.band_min)
-            legend.band_max = scale_function(legend.band_max)
+        band_mins = scale_function([legend.band_min for legend in self.items])
+        band_maxs = scale_function([legend.band_max for legend in self.items])
+        for legend, band_min, band_max in zip(self.items, band_mins, band_maxs):
+            legend.band_min = band_min
+            legend.band_max = band_max
 
 
 class CategoricalLegendItem(ResponseSchema):
@@ -244,22 +257,42 @@ class PlaceSchema(Schema):
     location_code: str = None
     location_poly: str = None
     geocoding: schemas_geocoding.GeocodePlace = None   # TODO make this private somehow?
+    _geocoded: bool = PrivateAttr(default=False)
+    _request_key: tuple = PrivateAttr(default=None)
+
+    def needs_geocoding(self):
+        if self._geocoded:
+            return False
+        # We assume that if all these values are filled in, then they are correct. This is probably fine.
+        return not all([self.location_name, self.location_scale, self.location_code, self.location_poly, self.geocoding])
+
+    def set_geocoding(self, geocoded):
+        self.location_name = geocoded.name
+        self.location_code = geocoded.id
+        self.location_scale = geocoded.scale
+        self.geocoding = geocoded
+        if not self.location_poly:
+            self.location_poly = bbox_to_wkt(geocoded.bbox)
+        self._geocoded = True
+
+    async def astandardise(self):
+        """standardise for async views: geocoding doesn't block the event loop, the rest runs on the sync executor"""
+        if self.needs_geocoding():
+            self.set_geocoding(await astandardise_location(
+                location_name=self.location_name,
+                location_code=self.location_code,
+                location_scale=self.location_scale,
+                location_poly=self.location_poly))
+        await run_sync(self.standardise)
 
     # TODO move standardisation to a separate, ur-class
     def standardise(self):
-        # We assume that if all these values are filled in, then they are correct. This is probably fine.
-        if not all([self.location_name, self.location_scale, self.location_code, self.location_poly, self.geocoding]):
-            geocoded = standardise_location(
+        if self.needs_geocoding():
+            self.set_geocoding(standardise_location(
                 location_name=self.location_name,
                 location_code=self.location_code,
                 location_scale=self.location_scale,
-                location_poly=self.location_poly)
-            self.location_name = geocoded.name
-            self.location_code = geocoded.id
-            self.location_scale = geocoded.scale
-            self.geocoding = geocoded
-            if not self.location_poly:
-                self.location_poly = bbox_to_wkt(geocoded.bbox)
+                location_poly=self.location_poly))
 
         self.rename_units()
 
@@ -270,10 +303,10 @@ class PlaceSchema(Schema):
             haz_unit_type = units.HAZARD_UNIT_TYPES[self.hazard_type]
             allowed_units = units.UNIT_OPTIONS[haz_unit_type]
             if self.units_hazard not in allowed_units:
-                raise ValueError(f'Units incompatible with hazard in {type(self).__name__}. '
-                                 f'\nHazard type: {self.hazard_type} '
-                                 f'\nUnits provided: {self.units_hazard} '
-                                 f'\nAllowed units: {allowed_units}')
+                raise RequestValidationError(f'Units incompatible with hazard in {type(self).__name__}. '
+                                             f'\nHazard type: {self.hazard_type} '
+                                             f'\nUnits provided: {self.units_hazard} '
+                                             f'\nAllowed units: {allowed_units}')
 
         if hasattr(self, 'hazard_type') and hasattr(self, 'exposure_type') and not hasattr(self, 'impact_type'):
             raise ValueError('I thought I made sure this would never happen')
@@ -286,9 +319,9 @@ class PlaceSchema(Schema):
             if hasattr(self, 'exposure_type'):
                 if self.exposure_type:
                     if self.exposure_type != exposure_type:
-                        raise ValueError(f'Requested exposure type ({self.exposure_type}) mismatch with '
-                                         f'exposure type inferred from impact ({self.impact_type} gives '
-                                         f'{exposure_type}')
+                        raise RequestValidationError(f'Requested exposure type ({self.exposure_type}) mismatch with '
+                                                     f'exposure type inferred from impact ({self.impact_type} gives '
+                                                     f'{exposure_type}')
                 else:
                     self.__setattr__('exposure_type', exposure_type)
 
@@ -304,26 +337,27 @@ class PlaceSchema(Schema):
                 valid_exposure_units = units.get_valid_exposure_units(exposure_type=exposure_type)
 
             if self.units_exposure not in valid_exposure_units:
-                raise ValueError(f'Units incompatible with exposure in {type(self).__name__}. '
-                                 f'\nExposure type: {exposure_type} '
-                                 f'\nUnits provided: {self.units_exposure} '
-                                 f'\nAllowed units: {allowed_units}')
+                raise RequestValidationError(f'Units incompatible with exposure in {type(self).__name__}. '
+                                             f'\nExposure type: {exposure_type} '
+                                             f'\nUnits provided: {self.units_exposure} '
+                                             f'\nAllowed units: {allowed_units}')
         elif hasattr(self, 'units_exposure'):
             raise ValueError('There should be a check for valid exposures somehow here.')
 
         if hasattr(self, 'units_currency') and hasattr(self, 'units_exposure'):
             if self.units_exposure and self.units_exposure != 'people':  # TODO make this is units type check from the enums
                 if self.units_exposure != self.units_currency:
-                    raise ValueError(f'When using financial exposures in a cost-benefit, the units should be the same:'
-                                     f'\nCost: {self.units_currency}'
-                                     f'\nExposure {self.units_exposure}')
+                    raise RequestValidationError(
+                        f'When using financial exposures in a cost-benefit, the units should be the same:'
+                        f'\nCost: {self.units_currency}'
+                        f'\nExposure {self.units_exposure}')
 
         if hasattr(self, 'units_warming'):
-            allowed_units = get_option_choices(['data', 'units', 'temperature'], get_value='value')
+            allowed_units = get_unit_options('temperature')
             if self.units_warming not in allowed_units:
-                raise ValueError(f'Units incompatible with temperature in {type(self).__name__}. '
-                                 f'\nUnits provided: {self.units_warming} '
-                                 f'\nAllowed units: {allowed_units}')
+                raise RequestValidationError(f'Units incompatible with temperature in {type(self).__name__}. '
+                                             f'\nUnits provided: {self.units_warming} '
+                                             f'\nAllowed units: {allowed_units}')
 
     def rename_units(self):
         # Rename common units to our internally standard name (e.g. celsius -> degC, dollars -> USD)
@@ -334,7 +368,7 @@ class PlaceSchema(Schema):
                 self.__setattr__(unit_param, units.UNIT_NAME_CORRECTIONS[unit_name.lower()])
 
     def get_id(self):
-        return util.get_hash(self)
+        return request_key(self)
 
 
 class ScenarioSchema(PlaceSchema):
@@ -444,13 +478,13 @@ class BreakdownBar(ResponseSchema):
     combined_measure_climate: float = None
 
     def convert_breakdown_units(self, temperature_units, response_units):
+        self.scale_breakdown(*breakdown_conversion_functions(temperature_units, response_units))
+
+    def scale_breakdown(self, temp_scale_fn, response_scale_fn=None):
         if self.temperature:
-            delta_units = ('delta_' + temperature_units[0], 'delta_' + temperature_units[1])
-            temp_scale_fn = units.make_conversion_function(delta_units[0], delta_units[1])
             self.__setattr__('temperature', temp_scale_fn(self.temperature))
 
-        if response_units[0] not in units.UNITS_NOT_TO_CONVERT:
-            response_scale_fn = units.make_conversion_function(response_units[0], response_units[1])
+        if response_scale_fn:
             for response_var in ['current_climate', 'growth_change', 'climate_change', 'future_climate',
                                  'combined_measure_change', 'combined_measure_climate']:
                 old_value = self.__getattribute__(response_var)
@@ -459,7 +493,22 @@ class BreakdownBar(ResponseSchema):
             for response_list in ['measure_change', 'measure_climate']:
                 old_value = self.__getattribute__(response_list)
                 if old_value:
-                    self.__setattr__(response_list, [response_scale_fn(x) for x in old_value])
+                    self.__setattr__(response_list, response_scale_fn(old_value))
+
+
+def breakdown_conversion_functions(temperature_units, response_units):
+    # Temperatures in breakdowns are changes in temperature, so they convert without an offset
+    delta_units = ('delta_' + temperature_units[0], 'delta_' + temperature_units[1])
+    temp_scale_fn = units.make_conversion_function(delta_units[0], delta_units[1])
+    if response_units[0] in units.UNITS_NOT_TO_CONVERT:
+        return temp_scale_fn, None
+    return temp_scale_fn, units.make_conversion_function(response_units[0], response_units[1])
+
+
+def convert_breakdown_bars(bars: List[BreakdownBar], temperature_units, response_units):
+    # Build the conversion functions once and share them between all the bars in a chart
+    conversion_functions = breakdown_conversion_functions(temperature_units, response_units)
+    _ = [bar.scale_breakdown(*conversion_functions) for bar in bars]
 
 
 class Timeline(ResponseSchema):
@@ -472,7 +521,7 @@ class Timeline(ResponseSchema):
         response_type = units.UNIT_TYPES[self.units_response]
         response_from_to = (self.units_response, units_dict[response_type])
         temperature_from_to = (self.units_warming, units_dict['temperature'])
-        _ = [bar.convert_breakdown_units(temperature_from_to, response_from_to) for bar in self.items]
+        convert_breakdown_bars(self.items, temperature_from_to, response_from_to)
         ResponseSchema.convert_units(self, units_dict)
 
 
@@ -594,14 +643,10 @@ class CostBenefit(ResponseSchema):
 
         response_conversion_fn = units.make_conversion_function(self.units_response, units_dict[response_type])
         cost_conversion_fn = units.make_conversion_function(self.units_currency, units_dict['currency'])
-        costbenefit_conversion_factor = response_conversion_fn(1) / cost_conversion_fn(1)  # This is allowed because it's not temperature
-
-        print("FIGURING OUT COSTBEN")
-        print(self.dict())
-        print(str(cost_conversion_fn(1000)))
+        costbenefit_conversion_factor = response_conversion_fn.factor / cost_conversion_fn.factor  # This is allowed because it's not temperature
 
-        _ = [bar.convert_breakdown_units(temperature_from_to, response_from_to) for bar in self.items]
-        self.cost = [cost_conversion_fn(x) for x in self.cost]
+        convert_breakdown_bars(self.items, temperature_from_to, response_from_to)
+        self.cost = cost_conversion_fn(self.cost)
         self.costbenefit = [costbenefit_conversion_factor * x for x in self.costbenefit]
         if self.combined_cost:
             self.combined_cost = cost_conversion_fn(self.combined_cost)
@@ -1,11 +1,11 @@
 from ninja import Schema, ModelSchema
+from pydantic import PrivateAttr
 from typing import List
-from shapely import wkt
 from shapely.geometry import Polygon
 
 from calc_api.config import ClimadaCalcApiConfig
 from calc_api.vizz.models import Location
-from calc_api.calc_methods import util
+from calc_api.calc_methods import util, location_geometry
 
 conf = ClimadaCalcApiConfig()
 
@@ -20,17 +20,14 @@ class GeocodePlace(ModelSchema):
     # Note that this overrides the database versions of these parameters, which are well-known text strings
     bbox: List[float] = None
     poly: List[List[float]] = None
+    _key_json: tuple = PrivateAttr(default=None)   # See job_management.request_key
 
     @classmethod
     def from_location_model(cls, loc: Location):
-        bbox = wkt.loads(loc.bbox).bounds if loc.bbox else None
-        if loc.poly:
-            poly = util.poly_to_coords(wkt.loads(loc.poly))
-        elif loc.bbox:
-            poly = util.poly_to_coords(wkt.loads(loc.bbox))
-        else:
-            poly = None
-        return Location(
+        bbox = location_geometry.location_bbox(loc)
+        poly = location_geometry.location_poly(loc)
+        poly = util.poly_to_coords(poly) if poly else None
+        return cls(
             name=loc.name,
             id=loc.id,
             scale=loc.scale,
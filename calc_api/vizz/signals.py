@@ -0,0 +1,37 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from calc_api.vizz.models import JobLog, Location, LocationPolygon
+from calc_api.job_management.response_cache import invalidate_job
+from calc_api.calc_methods.location_geometry import LOCATIONS_VERSION, set_geometry, save_polygons
+
+
+@receiver(pre_save, sender=JobLog)
+def clear_unvalidated_result(sender, instance, **kwargs):
+    # Only results written through store_validated_result may be served from the fast path
+    if not getattr(instance, '_result_validated', False):
+        instance.result_schema = None
+        instance.result_json = None
+        instance.result_uri = None
+    instance._result_validated = False
+
+
+@receiver([post_save, post_delete], sender=JobLog)
+def invalidate_joblog_responses(sender, instance, **kwargs):
+    invalidate_job(instance.job_hash)
+
+
+@receiver(pre_save, sender=Location)
+def set_location_geometry(sender, instance, **kwargs):
+    set_geometry(instance)
+
+
+@receiver(post_save, sender=Location)
+def save_location_polygons(sender, instance, **kwargs):
+    save_polygons(instance, LocationPolygon)
+
+
+@receiver([post_save, post_delete], sender=Location)
+def bump_locations_version(sender, instance, **kwargs):
+    # Tells every worker, not just this one, to reload its location indexes
+    LOCATIONS_VERSION.bump()
@@ -1,10 +1,17 @@
+import threading
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+
 from calc_api.config import ClimadaCalcApiConfig
-from calc_api.vizz import enums
-from pint import UnitRegistry
-from forex_python.converter import CurrencyRates
+from calc_api.util import RequestValidationError
+from calc_api.vizz import enums, currency
+from climada_calc.settings import BASE_DIR
 
 conf = ClimadaCalcApiConfig()
-ureg = UnitRegistry()
+
+_unit_registry = None
+_unit_registry_lock = threading.Lock()
 
 
 # Units used in CLIMADA Data API products
@@ -43,23 +50,128 @@ UNIT_OPTIONS = {
 UNIT_TYPES = {unit_name: unit_type for unit_type, options_list in UNIT_OPTIONS.items() for unit_name in options_list}
 
 HAZARD_UNIT_TYPES = {
-    haz: enums.get_option_parameter(['data', 'filters', haz], parameter="unit_type") for haz in enums.HazardTypeEnum
+    haz: enums.get_hazard_unit_type(haz) for haz in enums.HazardTypeEnum
 }
 
 
+class UnitConverter:
+    """
+    Converts values between two units. Multiplicative units convert as value * factor. For offset units such as
+    degF, the value goes through pint's own three steps (to the reference unit, scale, from the reference unit) in
+    the same order, so results match pint's to the last bit. The pint work only needs doing once per pair. Accepts
+    scalars, lists and numpy arrays, and passes None through.
+    """
+    __slots__ = ('units_from', 'units_to', 'factor', 'to_reference', 'from_reference')
+
+    def __init__(self, units_from, units_to, factor=1.0, to_reference=None, from_reference=None):
+        self.units_from = units_from
+        self.units_to = units_to
+        self.factor = factor
+        # (scale, offset) of pint's OffsetConverter for an offset unit on either side, else None
+        self.to_reference = to_reference
+        self.from_reference = from_reference
+
+    @property
+    def is_identity(self):
+        return self.factor == 1 and self.to_reference is None and self.from_reference is None
+
+    def _convert(self, x):
+        if self.to_reference:
+            x = x * self.to_reference[0] + self.to_reference[1]
+        x = x * self.factor
+        if self.from_reference:
+            x = (x - self.from_reference[1]) / self.from_reference[0]
+        return x
+
+    def __call__(self, x):
+        if x is None:
+            return x
+        if self.is_identity:
+            # Converted values are new objects, so unconverted lists shouldn't be shared with the caller either
+            return x.copy() if isinstance(x, (list, np.ndarray)) else x
+        if isinstance(x, np.ndarray):
+            return self._convert(x)
+        if isinstance(x, (list, tuple)):
+            if any(v is None for v in x):
+                return [None if v is None else self._convert(v) for v in x]
+            return self._convert(np.asarray(x, dtype=float)).tolist()
+        return self._convert(x)
+
+    def __repr__(self):
+        return f'UnitConverter({self.units_from} -> {self.units_to}: factor {self.factor}, ' \
+               f'to reference {self.to_reference}, from reference {self.from_reference})'
+
+
+def get_unit_registry():
+    """
+    pint's UnitRegistry, built on first use: importing pint and parsing its definitions is most of the cost of
+    importing the API. With startup: unit-registry-cache set, pint pickles the parsed definitions there for next time.
+    """
+    global _unit_registry
+    if _unit_registry is None:
+        with _unit_registry_lock:
+            if _unit_registry is None:
+                from pint import UnitRegistry
+                cache = str(Path(BASE_DIR, conf.UNIT_REGISTRY_CACHE)) if conf.UNIT_REGISTRY_CACHE else None
+                _unit_registry = UnitRegistry(cache_folder=cache)
+    return _unit_registry
+
+
+def __getattr__(name):
+    # The registry used to be built at import as units.ureg
+    if name == 'ureg':
+        return get_unit_registry()
+    raise AttributeError(f'module {__name__} has no attribute {name}')
+
+
+def _parse_units(ureg, unit_name):
+    # As a full expression, the way the API always has, so names like square_kilometers work
+    return ureg(unit_name).units
+
+
+def _offset_unit(ureg, units):
+    """pint's definition of the units if they're an offset unit such as degC, else None"""
+    units_container = units._units
+    if len(units_container) != 1:
+        return None
+    (name, power), = units_container.items()
+    definition = ureg._units[name]
+    return None if power != 1 or definition.is_multiplicative else definition
+
+
+@lru_cache(maxsize=None)
+def get_unit_converter(units_from, units_to):
+    if units_from == units_to:
+        return UnitConverter(units_from, units_to)
+    ureg = get_unit_registry()
+    parsed_from, parsed_to = _parse_units(ureg, units_from), _parse_units(ureg, units_to)
+    offset_from, offset_to = _offset_unit(ureg, parsed_from), _offset_unit(ureg, parsed_to)
+    if offset_from is None and offset_to is None:
+        # pint converts multiplicative units as value * factor, with this factor
+        return UnitConverter(units_from, units_to, ureg.Quantity(1.0, parsed_from).to(parsed_to).m)
+    # Offset units convert via their reference units (kelvin for temperatures), see pint's NonMultiplicativeRegistry
+    reference_from = ureg.Unit(offset_from.reference) if offset_from else parsed_from
+    reference_to = ureg.Unit(offset_to.reference) if offset_to else parsed_to
+    return UnitConverter(
+        units_from, units_to,
+        factor=ureg.Quantity(1.0, reference_from).to(reference_to).m,
+        to_reference=(offset_from.converter.scale, offset_from.converter.offset) if offset_from else None,
+        from_reference=(offset_to.converter.scale, offset_to.converter.offset) if offset_to else None
+    )
+
+
 def make_conversion_function(units_from, units_to):
-    # print(f"CONVERSION: {units_from} - {units_to}")
     if units_from == units_to:
-        return lambda x: x
+        return get_unit_converter(units_from, units_to)
 
     if units_from in UNIT_OPTIONS['currency']:
         if units_to not in UNIT_OPTIONS['currency']:
             raise ValueError(f'Unable to convert currency to {units_to}.'
                              f'Either this is not a currency or it is not listed in the API options')
-        c = CurrencyRates()
-        return lambda x: x * c.get_rate(units_from, units_to)
+        # Exchange rates change so these aren't memoised, but the rate comes from the in-memory rate table
+        return UnitConverter(units_from, units_to, factor=currency.get_rate(units_from, units_to))
 
-    return lambda x: ureg.Quantity(x, ureg(units_from)).to(ureg(units_to)).m
+    return get_unit_converter(units_from, units_to)
 
 
 def get_request_unit_parameters(s):
@@ -75,14 +187,15 @@ def get_request_unittype_to_unitname_mapping(s):
     for param in unit_parameters:
         unit_name = s.dict()[param]
         if unit_name not in UNIT_TYPES.keys():
-            raise ValueError(f'Processing parameter request: did not recognise {unit_name} as a unit request variable. '
-                             f'Valid units: {UNIT_TYPES.keys()}')
+            raise RequestValidationError(
+                f'Processing parameter request: did not recognise {unit_name} as a unit request variable. '
+                f'Valid units: {UNIT_TYPES.keys()}')
         unit_type = UNIT_TYPES[unit_name]
         if unit_type in requested_units.keys() and requested_units[unit_type] != unit_name:
-            raise ValueError(
+            raise RequestValidationError(
                 f'Units clash. Conflicting units have been provided for unit type {unit_type}. '
                 f'\n Requested units: {requested_units[unit_type]} and {unit_name}. '
-                f'\n Full {type(s).__name__} request: {s.POST.dict()}'
+                f'\n Full {type(s).__name__} request: {s.dict()}'
             )
         requested_units[unit_type] = unit_name
     return requested_units
@@ -94,20 +207,27 @@ def get_request_parameter_to_unittype_mapping(s):
     for param in unit_parameters:
         unit_name = s.dict()[param]
         if unit_name not in UNIT_TYPES.keys():
-            raise ValueError(f'Processing parameter request: did not recognise {unit_name} as a unit request variable. '
-                             f'Valid units: {UNIT_TYPES.keys()}')
+            raise RequestValidationError(
+                f'Processing parameter request: did not recognise {unit_name} as a unit request variable. '
+                f'Valid units: {UNIT_TYPES.keys()}')
         unit_type = UNIT_TYPES[unit_name]
         requested_units[param] = unit_type
     return requested_units
 
 
+def get_native_unit_parameters(s):
+    # The request's unit parameters set to CLIMADA's native units (e.g. 'units_hazard': 'm/s')
+    parameter_to_unittype = get_request_parameter_to_unittype_mapping(s)
+    return {param: NATIVE_UNITS_CLIMADA[unit_type] for param, unit_type in parameter_to_unittype.items()}
+
+
 def get_valid_exposure_units(hazard_type=None, exposure_type=None):
     exposure_types_list = enums.get_exposure_types(hazard_type)
     if exposure_type:
         if exposure_type not in exposure_types_list:
-            raise ValueError(f"Inconsistent hazard_type and exposure_type provided: "
-                             f"\nHazard type: {hazard_type}"
-                             f"\nExposure type: {exposure_type}")
+            raise RequestValidationError(f"Inconsistent hazard_type and exposure_type provided: "
+                                         f"\nHazard type: {hazard_type}"
+                                         f"\nExposure type: {exposure_type}")
         exposure_types_list = [exposure_type]
     exposure_units = set()
     for exposure_type in exposure_types_list:
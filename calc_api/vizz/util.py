@@ -1,33 +1,151 @@
 import json
+import os
+import threading
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
 from climada_calc.settings import BASE_DIR
 
 OPTIONS_FILE = Path(BASE_DIR, "calc_api", "options.json")
 
 
+def _freeze(obj):
+    # Read-only copy of parsed JSON: dicts become mapping proxies and lists become tuples
+    if isinstance(obj, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
+
+def _index_choices(choices):
+    return MappingProxyType({choice['value']: choice for choice in choices})
+
+
+@dataclass(frozen=True)
+class HazardOptions:
+    """Pre-indexed options for one hazard, with choices keyed by their 'value'"""
+    name: str
+    value: str
+    unit_type: str
+    years: Mapping
+    scenarios: Mapping
+    return_periods: Mapping
+    impacts: Mapping
+
+    @classmethod
+    def from_options(cls, hazard_options):
+        scenario_options = hazard_options['scenario_options']
+        return cls(
+            name=hazard_options['name'],
+            value=hazard_options['value'],
+            unit_type=hazard_options['unit_type'],
+            years=_index_choices(scenario_options['year']['choices']),
+            scenarios=_index_choices(scenario_options['climate_scenario']['choices']),
+            return_periods=_index_choices(scenario_options['return_period']['choices']),
+            impacts=_index_choices(scenario_options['impact_type']['choices']),
+        )
+
+
+@dataclass(frozen=True)
+class _OptionsSnapshot:
+    mtime: int
+    options: Mapping
+    json: bytes
+    hazards: Mapping
+    units: Mapping
+
+
+class OptionsRegistry:
+    """
+    Holds options.json parsed once. The file is re-read only when its modification time changes, and everything
+    handed out is read-only so callers can't corrupt the shared copy.
+    """
+
+    def __init__(self, options_file=OPTIONS_FILE):
+        self.options_file = Path(options_file)
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _load(self, mtime):
+        with open(self.options_file, 'rb') as f:
+            raw = f.read()
+        options = json.loads(raw)
+        frozen = _freeze(options)
+        hazards = {
+            haz: HazardOptions.from_options(haz_options)
+            for haz, haz_options in frozen['data']['filters'].items()
+        }
+        unit_options = {
+            unit_type: tuple(choice['value'] for choice in unit_choices['choices'])
+            for unit_type, unit_choices in frozen['data']['units'].items()
+        }
+        return _OptionsSnapshot(
+            mtime=mtime,
+            options=frozen,
+            json=json.dumps(options, separators=(',', ':')).encode('utf-8'),
+            hazards=MappingProxyType(hazards),
+            units=MappingProxyType(unit_options)
+        )
+
+    @property
+    def snapshot(self) -> _OptionsSnapshot:
+        mtime = os.stat(self.options_file).st_mtime_ns
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.mtime != mtime:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.mtime != mtime:
+                    snapshot = self._load(mtime)
+                    self._snapshot = snapshot
+        return snapshot
+
+    @property
+    def options(self) -> Mapping:
+        return self.snapshot.options
+
+    def as_json(self) -> bytes:
+        return self.snapshot.json
+
+    @property
+    def hazards(self) -> Mapping:
+        return self.snapshot.hazards
+
+    def hazard(self, hazard_type) -> HazardOptions:
+        try:
+            return self.snapshot.hazards[hazard_type]
+        except KeyError:
+            raise ValueError(f'No options found for hazard type {hazard_type}. '
+                             f'Valid hazards: {list(self.snapshot.hazards.keys())}') from None
+
+    def unit_options(self, unit_type) -> Tuple[str]:
+        try:
+            return self.snapshot.units[unit_type]
+        except KeyError:
+            raise ValueError(f'No options found for unit type {unit_type}. '
+                             f'Valid unit types: {list(self.snapshot.units.keys())}') from None
+
+
+OPTIONS = OptionsRegistry()
+
+
 def get_options():
-    return json.load(open(OPTIONS_FILE))
+    return OPTIONS.options
 
 
 def options_return_period_to_description(rp, hazard_type):
     rp = str(rp)
-    options = get_options(hazard_type)
-    out = [opt['description'] for opt in options if opt['value'] == rp]
-    if len(out) == 0:
+    return_periods = OPTIONS.hazard(hazard_type).return_periods
+    if rp not in return_periods:
         raise ValueError(f'No option matches found for {rp}-year return period and hazard {hazard_type}')
-    if len(out) > 1:
-        raise ValueError(f'Too many matches found for {rp}-year return period and hazard {hazard_type}: {out}')
-    return out[0]
+    return return_periods[rp]['name']
 
 
 def options_scenario_to_description(scenario, hazard_type):
     # TODO deal with custom scenarios
-    options = get_options()['data']['filters'][hazard_type]['scenario_options']['climate_scenario']['choices']
-    out = [opt['description'] for opt in options if opt['value'] == scenario]
-    if len(out) == 0:
+    scenarios = OPTIONS.hazard(hazard_type).scenarios
+    if scenario not in scenarios:
         raise ValueError(f'No option matches found for {scenario} scenario and hazard {hazard_type}')
-    if len(out) > 1:
-        raise ValueError(f'Too many matches found for {scenario} scenario and hazard {hazard_type}: {out}')
-    return out[0]
-
-
+    return scenarios[scenario]['description']
@@ -0,0 +1,77 @@
+"""
+Build the API's lazily-loaded state ahead of the first request. Run in the gunicorn master after the app is preloaded,
+so every worker forked from it starts with the state in place instead of building its own.
+"""
+import logging
+import time
+
+from calc_api.config import ClimadaCalcApiConfig
+
+conf = ClimadaCalcApiConfig()
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(getattr(logging, conf.LOG_LEVEL))
+
+
+def _unit_registry():
+    from calc_api.vizz.units import get_unit_registry
+    get_unit_registry()
+
+
+def _country_index():
+    from calc_api.calc_methods.util import get_country_index
+    get_country_index()
+
+
+def _options():
+    from calc_api.vizz.util import OPTIONS
+    OPTIONS.snapshot
+
+
+def _precomputed():
+    from calc_api.job_management.precomputed import PRECOMPUTED
+    PRECOMPUTED.payloads
+
+
+def _autocomplete_index():
+    from calc_api.calc_methods.autocomplete import AUTOCOMPLETE_INDEX
+    len(AUTOCOMPLETE_INDEX)
+
+
+def _spatial_index():
+    from calc_api.calc_methods.spatial_index import SPATIAL_INDEX
+    SPATIAL_INDEX.reverse(0, 0)
+
+
+def _precalculated_locations():
+    from calc_api.calc_methods.reca_locations import PRECALCULATED_LOCATIONS
+    PRECALCULATED_LOCATIONS.places
+
+
+# The last three read the Location table
+WARM_UP_STEPS = {
+    'unit registry': _unit_registry,
+    'country index': _country_index,
+    'options': _options,
+    'precomputed payloads': _precomputed,
+    'autocomplete index': _autocomplete_index,
+    'spatial index': _spatial_index,
+    'precalculated locations': _precalculated_locations,
+}
+
+
+def warm_up():
+    """
+    Run each warm-up step, logging how long it took. A step that fails is logged and skipped: its state is then built
+    on first use, as without a warm-up. Returns the names of the steps that failed.
+    """
+    failed = []
+    for name, step in WARM_UP_STEPS.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            LOGGER.warning(f'Warm-up step {name} failed, leaving it to the first request: {e}')
+            failed.append(name)
+            continue
+        LOGGER.info(f'Warmed up {name} in {1000 * (time.perf_counter() - start):.0f} ms')
+    return failed
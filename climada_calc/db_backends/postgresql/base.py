@@ -0,0 +1,36 @@
+"""
+Django's PostgreSQL backend with the connection health checks from Django 4.1 (the CONN_HEALTH_CHECKS setting).
+With persistent connections (CONN_MAX_AGE > 0) a connection can die between requests: the database restarts, or a
+load balancer drops it while idle. When CONN_HEALTH_CHECKS is on, a reused connection is checked before its first
+query in each request and replaced if it's gone, rather than failing the request. Drop this on Django >= 4.1.
+"""
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        self.health_check_enabled = settings_dict.get('CONN_HEALTH_CHECKS', False)
+        self.health_check_done = False
+
+    def connect(self):
+        super().connect()
+        # A new connection doesn't need checking
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Called at the start and end of each request: a connection that survives it is checked again before reuse
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if self.connection is None or not self.health_check_enabled or self.health_check_done:
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -80,7 +80,9 @@ WSGI_APPLICATION = 'climada_calc.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
-ASGI_THREADS = 18  # Heroku postgres free tier allows 20 connections
+# See docs/database_connections.md for how these add up to the number of connections the database sees.
+# Threads running sync code for async views, per asgi worker. Each can hold one database connection
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 18))  # Heroku postgres free tier allows 20 connections
 
 # Construct database location from environment variables
 db_address = os.environ.get('DATABASE_URL')
@@ -93,22 +95,64 @@ if not db_address:
 DATABASES = {
     "default": dj_database_url.config(default=db_address)
 }
-DATABASES['default']['ENGINE'] = "django.db.backends.postgresql_psycopg2"
+# The stock postgres backend plus health checks for persistent connections
+DATABASES['default']['ENGINE'] = "climada_calc.db_backends.postgresql"
+
+# Seconds to keep a connection open between requests. 0 closes it after every request, 'None' never closes it
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '60')
+DATABASES['default']['CONN_MAX_AGE'] = None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') != 'False'
+DATABASES['default']['OPTIONS'] = {
+    **DATABASES['default'].get('OPTIONS', {}),
+    'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+    # TCP keepalives stop idle persistent connections being dropped silently by firewalls and load balancers
+    'keepalives': 1,
+    'keepalives_idle': 60,
+    'keepalives_interval': 10,
+    'keepalives_count': 5,
+}
+if os.environ.get('DB_SSLMODE'):
+    DATABASES['default']['OPTIONS']['sslmode'] = os.environ['DB_SSLMODE']
+
+# Set DB_POOL_MODE=pgbouncer when connecting through PgBouncer in transaction pooling mode. Server-side cursors
+# (used by QuerySet.iterator) don't survive transaction pooling, so they're turned off.
+DB_POOL_MODE = os.environ.get('DB_POOL_MODE', 'none')
+if DB_POOL_MODE == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+elif DB_POOL_MODE != 'none':
+    raise ValueError(f'DB_POOL_MODE must be one of none, pgbouncer. Current value: {DB_POOL_MODE}')
 
 
 # Cache
 # https://docs.djangoproject.com/en/4.0/topics/cache/
-# TODO optimise settings for Redis (see above url)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Shared between workers when using the file or redis backends. Per-endpoint timeouts are set in
+# climada_calc-config.yaml. Use locmem as a stand-in for Redis in tests and local development.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'climada_calc',
+        }
     }
-    # 'default': {
-    #     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-    #     'LOCATION': os.environ.get('REDIS_URL'),
-    #     'TIMEOUT': 60 * 24
-    # }
-}
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    raise ValueError(f'CACHE_BACKEND must be one of locmem, file, redis. Current value: {CACHE_BACKEND}')
 
 
 # Internationalization
@@ -0,0 +1,83 @@
+"""
+gunicorn settings for serving the API in production, read from the server section of climada_calc-config.yaml.
+Started by setup.sh when server: mode is wsgi or asgi. See docs/serving.md
+"""
+import multiprocessing
+import os
+
+from calc_api.config import ClimadaCalcApiConfig
+from calc_api.job_management.sync_executor import SYNC_THREADS
+
+conf = ClimadaCalcApiConfig()
+
+if conf.SERVER_MODE not in ['wsgi', 'asgi']:
+    raise ValueError(f'gunicorn serves server: mode wsgi or asgi. Received {conf.SERVER_MODE}')
+
+
+def cpu_count():
+    # The CPUs this process may run on, which in a container can be fewer than the machine has
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def connections_per_worker():
+    # See docs/database_connections.md
+    return conf.SERVER_THREADS + SYNC_THREADS if conf.SERVER_MODE == 'wsgi' else SYNC_THREADS
+
+
+def default_workers():
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    if conf.SERVER_WORKERS:
+        return conf.SERVER_WORKERS
+    # Sync workers spend much of each request waiting on the database. An async worker keeps a CPU busy on its own
+    n_workers = 2 * cpu_count() + 1 if conf.SERVER_MODE == 'wsgi' else cpu_count()
+    if conf.SERVER_DB_CONNECTIONS:
+        n_workers = min(n_workers, max(1, conf.SERVER_DB_CONNECTIONS // connections_per_worker()))
+    return n_workers
+
+
+if conf.SERVER_MODE == 'wsgi':
+    wsgi_app = 'climada_calc.wsgi:application'
+    threads = conf.SERVER_THREADS
+    worker_class = 'gthread' if threads > 1 else 'sync'
+else:
+    wsgi_app = 'climada_calc.asgi:application'
+    # Async views run their ORM code on ASGI_THREADS threads per worker, see sync_executor
+    worker_class = 'uvicorn.workers.UvicornWorker'
+
+bind = conf.SERVER_BIND
+if os.environ.get('PORT'):
+    bind = bind.rsplit(':', 1)[0] + ':' + os.environ['PORT']
+
+workers = default_workers()
+timeout = conf.SERVER_TIMEOUT
+graceful_timeout = conf.SERVER_GRACEFUL_TIMEOUT
+keepalive = conf.SERVER_KEEP_ALIVE
+max_requests = conf.SERVER_MAX_REQUESTS
+max_requests_jitter = conf.SERVER_MAX_REQUESTS_JITTER
+preload_app = conf.SERVER_PRELOAD
+
+accesslog = '-'
+errorlog = '-'
+loglevel = conf.LOG_LEVEL.lower()
+
+
+def when_ready(server):
+    # With preload_app the API is imported by now, and workers are forked after this returns
+    if preload_app:
+        if conf.SERVER_WARM_UP:
+            from calc_api.warmup import warm_up, WARM_UP_STEPS
+            failed = warm_up()
+            server.log.info(f'Warmed up {len(WARM_UP_STEPS) - len(failed)} of {len(WARM_UP_STEPS)} steps. '
+                            f'Failed: {", ".join(failed) or "none"}')
+        # Workers mustn't inherit the master's database connections
+        from django.db import connections
+        connections.close_all()
+    server.log.info(f'Serving {wsgi_app} on {bind} with {workers} {worker_class} workers')
+    n_connections = workers * connections_per_worker()
+    if conf.SERVER_DB_CONNECTIONS and n_connections > conf.SERVER_DB_CONNECTIONS:
+        server.log.warning(f'The workers can open up to {n_connections} database connections, more than '
+                           f'server: db-connections ({conf.SERVER_DB_CONNECTIONS})')
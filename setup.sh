@@ -2,4 +2,10 @@
 #python manage.py makemigrations --noinput
 #python manage.py migrate --noinput
 python manage.py collectstatic --noinput
-python manage.py runserver 0.0.0.0:8000
+
+# server: mode in climada_calc-config.yaml, or the CLIMADA_CALC_SERVER_MODE environment variable
+SERVER_MODE=$(python -c "from calc_api.config import ClimadaCalcApiConfig; print(ClimadaCalcApiConfig().SERVER_MODE)")
+if [ "$SERVER_MODE" = "dev" ]; then
+    exec python manage.py runserver 0.0.0.0:8000
+fi
+exec gunicorn --config gunicorn.conf.py